@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api.db import close_unusable_connections
+        request_started.connect(close_unusable_connections)
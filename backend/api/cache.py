@@ -0,0 +1,243 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+from recipes.versions import (CATALOGUE, catalogue_version, get_cache,
+                              get_versions, get_versions_modified)
+
+RECIPE_CACHE_HITS = 'recipes:cache:hits'
+RECIPE_CACHE_MISSES = 'recipes:cache:misses'
+
+
+def cached_catalogue(name, render):
+    cache = get_cache()
+    key = f'catalogue:{name}:{catalogue_version()}'
+    entry = cache.get(key)
+    if entry is None:
+        content = render()
+        entry = (content, f'"{hashlib.md5(content).hexdigest()}"')
+        cache.set(key, entry, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return entry
+
+
+class CatalogueCacheMixin:
+    catalogue_name = None
+
+    def render_catalogue(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        content, etag = cached_catalogue(
+            self.catalogue_name, self.render_catalogue)
+        response = get_conditional_response(request, etag=etag) or (
+            HttpResponse(content, content_type='application/json'))
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.CATALOGUE_MAX_AGE}')
+        return response
+
+
+def count(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cache_is_shared():
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def recipe_cache_stats():
+    stats = get_cache().get_many([RECIPE_CACHE_HITS, RECIPE_CACHE_MISSES])
+    hits = stats.get(RECIPE_CACHE_HITS, 0)
+    misses = stats.get(RECIPE_CACHE_MISSES, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 3) if hits else 0,
+        'shared': cache_is_shared(),
+    }
+
+
+def recipe_bodies(recipe_ids, request):
+    cache = get_cache()
+    catalogue, authors, *versions = get_versions(
+        [CATALOGUE, 'recipes:authors',
+         *(f'recipe:{pk}' for pk in recipe_ids)])
+    origin = hashlib.md5(
+        request.build_absolute_uri('/').encode()).hexdigest()[:8]
+    keys = {
+        pk: f'recipes:body:{origin}:{pk}:{catalogue}:{authors}:{version}'
+        for pk, version in zip(recipe_ids, versions)
+    }
+    cached = cache.get_many(keys.values())
+    bodies = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in recipe_ids if pk not in bodies]
+    if missing:
+        recipes = Recipe.objects.filter(pk__in=missing).with_user_flags(
+            AnonymousUser()).with_related()
+        serializer = RecipeSerializer(
+            recipes, many=True, context={'request': request})
+        rendered = {body['id']: body for body in serializer.data}
+        cache.set_many(
+            {keys[pk]: body for pk, body in rendered.items()},
+            timeout=settings.RECIPE_CACHE_TIMEOUT)
+        bodies.update(rendered)
+    return bodies
+
+
+def viewer_flags(recipe_ids, user):
+    if not user.is_authenticated:
+        return {}
+    rows = Recipe.objects.filter(pk__in=recipe_ids).with_user_flags(
+        user).order_by().values_list(
+            'id', 'is_favorited', 'is_in_shopping_cart',
+            'is_author_subscribed')
+    return {pk: flags for pk, *flags in rows}
+
+
+def recipe_validators(pk, user):
+    fields = ['updated_at']
+    queryset = Recipe.objects.filter(pk=pk)
+    if user.is_authenticated:
+        fields += ['is_favorited', 'is_in_shopping_cart',
+                   'is_author_subscribed']
+        queryset = queryset.with_user_flags(user)
+    row = queryset.order_by().values_list(*fields).first()
+    if row is None:
+        return None
+    updated_at, *flags = row
+    versions, versions_modified = get_versions_modified(
+        [CATALOGUE, 'recipes:authors', f'recipe:{pk}'])
+    fingerprint = json.dumps(
+        [pk, updated_at.isoformat(), versions, flags])
+    etag = f'W/"{hashlib.md5(fingerprint.encode()).hexdigest()}"'
+    if versions_modified is None:
+        return etag, None
+    return etag, int(max(updated_at, versions_modified).timestamp())
+
+
+def profile_etag(user):
+    fingerprint = json.dumps([
+        user.pk, user.email, user.username,
+        user.first_name, user.last_name,
+    ])
+    return f'W/"{hashlib.md5(fingerprint.encode()).hexdigest()}"'
+
+
+def render_recipes(recipe_ids, request):
+    bodies = recipe_bodies(recipe_ids, request)
+    flags = viewer_flags(recipe_ids, request.user)
+    results = []
+    for pk in recipe_ids:
+        if pk not in bodies:
+            continue
+        body = bodies[pk]
+        if pk in flags:
+            is_favorited, is_in_shopping_cart, is_subscribed = flags[pk]
+            body = {**body, 'author': {**body['author'],
+                                       'is_subscribed': is_subscribed}}
+            body['is_favorited'] = is_favorited
+            body['is_in_shopping_cart'] = is_in_shopping_cart
+        results.append(body)
+    return results
+
+
+class RecipeCacheMixin:
+
+    def list_namespaces(self, request):
+        author = request.query_params.get('author')
+        if author:
+            return [f'recipes:author:{author}']
+        tags = request.query_params.getlist('tags')
+        if tags:
+            return [f'recipes:tag:{slug}' for slug in sorted(set(tags))]
+        return ['recipes']
+
+    def response_key(self, request, namespaces):
+        versions = get_versions(
+            [CATALOGUE, 'recipes:authors', *namespaces])
+        params = sorted(
+            (key, sorted(set(values)))
+            for key, values in request.query_params.lists()
+        )
+        fingerprint = json.dumps(
+            [request.get_host(), request.path, params, versions])
+        return ('recipes:response:'
+                f'{hashlib.md5(fingerprint.encode()).hexdigest()}')
+
+    def cached_response(self, handler, namespaces, request, *args,
+                        **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = self.response_key(request, namespaces)
+        data = cache.get(key)
+        if data is not None:
+            count(RECIPE_CACHE_HITS)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        count(RECIPE_CACHE_MISSES)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data,
+                      timeout=settings.RECIPE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def render_list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(Recipe.objects.only('id', 'pub_date'))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            render_recipes([recipe.id for recipe in page], request))
+
+    def render_detail(self, request, pk=None, *args, **kwargs):
+        data = render_recipes([int(pk)], request) if pk.isdigit() else []
+        if not data:
+            raise NotFound
+        return Response(data[0])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.render_list, self.list_namespaces(request),
+            request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get('pk')
+        validators = recipe_validators(pk, request.user) if (
+            pk.isdigit()) else None
+        if validators is None:
+            raise NotFound
+        etag, last_modified = validators
+        if request.user.is_authenticated:
+            last_modified = None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.cached_response(
+                self.render_detail, [f'recipe:{pk}'],
+                request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,10 @@
+from django.db import connections
+
+
+def close_unusable_connections(**kwargs):
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
@@ -1,36 +1,60 @@
+from django.conf import settings
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Value,
+                              When)
+from django.utils.functional import cached_property
 from django_filters.rest_framework import (BooleanFilter, CharFilter,
-                                           FilterSet,
-                                           ModelMultipleChoiceFilter,
+                                           FilterSet, MultipleChoiceFilter,
                                            NumberFilter)
 
-from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.versions import catalogue_version, get_cache
+
+
+def tag_ids_by_slug():
+    cache = get_cache()
+    key = f'catalogue:tag-slugs:{catalogue_version()}'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
+    return tag_ids
 
 
 class IngredientFilter(FilterSet):
-    name = CharFilter(lookup_expr='icontains')
+    name = CharFilter(method='filter_by_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_by_name(self, queryset, name, value):
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('is_prefix', 'name')[:settings.INGREDIENT_SEARCH_LIMIT]
+
 
 class RecipeFilter(FilterSet):
     author = NumberFilter(
         field_name='author',
         label='Автор'
     )
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = MultipleChoiceFilter(
+        method='filter_by_tags',
         label='Теги'
     )
+    search = CharFilter(
+        method='filter_by_search',
+        label='Поиск'
+    )
     is_favorited = BooleanFilter(
         method='filter_by_favorited',
         label='Избранное'
     )
     is_in_shopping_cart = BooleanFilter(
-        field_name='shopping_cart__user',
         method='filter_by_shopping_cart',
         label='Список покупок'
     )
@@ -38,18 +62,40 @@ class RecipeFilter(FilterSet):
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'is_in_shopping_cart',
-                  'tags', 'author',)
+                  'tags', 'author', 'search',)
 
-    def filter_by_favorited(self, queryset, name, value):
-        user = self.request.user
-        if user.is_authenticated and value:
-            return queryset.filter(favorites__user=user)
-        return queryset
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filters['tags'].extra['choices'] = lambda: [
+            (slug, slug) for slug in self.tag_ids]
 
-    def filter_by_shopping_cart(self, queryset, name, value):
+    @cached_property
+    def tag_ids(self):
+        return tag_ids_by_slug()
+
+    def filter_by_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return queryset.search(value).order_by('-search_rank', '-pub_date')
+
+    def filter_by_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[self.tag_ids[slug] for slug in value
+                        if slug in self.tag_ids]
+        )))
+
+    def filter_by_user_relation(self, queryset, model, value):
         user = self.request.user
         if value and user.is_authenticated:
-            shopping_cart_recipes = ShoppingCart.objects.filter(
-                user=user).values('recipe')
-            return queryset.filter(id__in=shopping_cart_recipes)
+            return queryset.filter(Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
+
+    def filter_by_favorited(self, queryset, name, value):
+        return self.filter_by_user_relation(queryset, Favorite, value)
+
+    def filter_by_shopping_cart(self, queryset, name, value):
+        return self.filter_by_user_relation(queryset, ShoppingCart, value)
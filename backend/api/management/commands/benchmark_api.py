@@ -0,0 +1,222 @@
+import gc
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, Recipe, Tag
+from recipes.versions import get_cache
+from user.models import Subscription, User
+
+MIN_LATENCY_REGRESSION_MS = 5
+CACHE_MODES = ('warm', 'cold')
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def content_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число SQL-запросов и объём ответа '
+            'эндпоинтов API и сравнивает их с сохранённым эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', type=Path,
+                            help='Файл для сохранения результатов в JSON')
+        parser.add_argument('--baseline', type=Path,
+                            help='Файл с эталонными результатами')
+        parser.add_argument(
+            '--latency-tolerance',
+            type=float,
+            default=0.5,
+            help='Допустимый относительный рост p95 задержки'
+        )
+        parser.add_argument('--only', nargs='*',
+                            help='Запустить только указанные сценарии')
+        parser.add_argument(
+            '--cache',
+            nargs='*',
+            choices=CACHE_MODES,
+            default=list(CACHE_MODES),
+            help='warm — с прогретым кэшем, cold — с очисткой кэша '
+                 'API перед каждым запросом'
+        )
+
+    def fixtures(self):
+        user = User.objects.filter(
+            shoppingcarts__isnull=False,
+            subscriber__isnull=False).order_by('id').first()
+        recipe = Recipe.objects.exclude(
+            favorites__user=user).exclude(
+                shoppingcarts__user=user).order_by('-pub_date').first()
+        author = Subscription.objects.filter(user=user).first()
+        if not (user and recipe and author):
+            raise CommandError(
+                'Недостаточно данных: запустите generate_load_data')
+        tags = list(Tag.objects.values_list('slug', flat=True))
+        ingredient = Ingredient.objects.order_by('id').first()
+        return {
+            'user': user,
+            'recipe': recipe.id,
+            'author': author.author_id,
+            'tag': f'tags={tags[0]}' if tags else '',
+            'tags': '&'.join(f'tags={slug}' for slug in tags[:2]),
+            'all_tags': '&'.join(f'tags={slug}' for slug in tags),
+            'ingredient': ingredient.name[:3] if ingredient else 'а',
+        }
+
+    def scenarios(self, fixtures):
+        recipe = fixtures['recipe']
+        return {
+            'recipes_list': (False, [('get', '/api/recipes/')]),
+            'recipes_list_auth': (True, [('get', '/api/recipes/')]),
+            'recipes_list_limit_50': (
+                True, [('get', '/api/recipes/?limit=50')]),
+            'recipes_list_deep_page': (
+                False, [('get', '/api/recipes/?page=100')]),
+            'recipes_list_cursor': (
+                True, [('get', '/api/recipes/?cursor=')]),
+            'recipes_by_author': (
+                True, [('get', f'/api/recipes/?author={fixtures["author"]}')]),
+            'recipes_by_tag': (
+                True, [('get', f'/api/recipes/?{fixtures["tag"]}')]),
+            'recipes_by_tags': (
+                True, [('get', f'/api/recipes/?{fixtures["tags"]}')]),
+            'recipes_by_all_tags': (
+                True, [('get', f'/api/recipes/?{fixtures["all_tags"]}')]),
+            'recipes_by_all_tags_favorited': (True, [(
+                'get',
+                f'/api/recipes/?{fixtures["all_tags"]}&is_favorited=1')]),
+            'recipes_favorited': (
+                True, [('get', '/api/recipes/?is_favorited=1')]),
+            'recipes_in_shopping_cart': (
+                True, [('get', '/api/recipes/?is_in_shopping_cart=1')]),
+            'recipe_detail': (True, [('get', f'/api/recipes/{recipe}/')]),
+            'ingredients_search': (False, [
+                ('get', f'/api/ingredients/?name={fixtures["ingredient"]}')]),
+            'ingredients_all': (False, [('get', '/api/ingredients/')]),
+            'tags': (False, [('get', '/api/tags/')]),
+            'users_me': (True, [('get', '/api/users/me/')]),
+            'feed': (True, [('get', '/api/recipes/feed/')]),
+            'subscriptions': (True, [
+                ('get', '/api/users/subscriptions/?recipes_limit=3')]),
+            'favorite_toggle': (True, [
+                ('post', f'/api/recipes/{recipe}/favorite/'),
+                ('delete', f'/api/recipes/{recipe}/favorite/')]),
+            'shopping_cart_toggle': (True, [
+                ('post', f'/api/recipes/{recipe}/shopping_cart/'),
+                ('delete', f'/api/recipes/{recipe}/shopping_cart/')]),
+            'download_shopping_cart': (True, [
+                ('get', '/api/recipes/download_shopping_cart/')]),
+        }
+
+    def measure(self, client, requests, cold, options):
+        gc.collect()
+        gc.disable()
+        try:
+            return self.run_scenario(client, requests, cold, options)
+        finally:
+            gc.enable()
+
+    def run_scenario(self, client, requests, cold, options):
+        latencies, queries, sizes = [], [], []
+        for iteration in range(options['warmup'] + options['iterations']):
+            if cold:
+                get_cache().clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                size = 0
+                for method, path in requests:
+                    response = getattr(client, method)(path)
+                    if response.status_code >= 400:
+                        raise CommandError(
+                            f'{method.upper()} {path}: '
+                            f'{response.status_code}')
+                    size += content_size(response)
+                elapsed = (time.perf_counter() - started) * 1000
+            if iteration >= options['warmup']:
+                latencies.append(elapsed)
+                queries.append(len(context))
+                sizes.append(size)
+        return {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'queries': max(queries),
+            'bytes': max(sizes),
+        }
+
+    def compare(self, results, baseline, tolerance):
+        failures = []
+        for name, expected in baseline['results'].items():
+            actual = results.get(name)
+            if actual is None:
+                continue
+            if actual['queries'] > expected['queries']:
+                failures.append(
+                    f'{name}: SQL-запросов {actual["queries"]} '
+                    f'(эталон {expected["queries"]})')
+            allowed = max(expected['p95_ms'] * (1 + tolerance),
+                          expected['p95_ms'] + MIN_LATENCY_REGRESSION_MS)
+            if actual['p95_ms'] > allowed:
+                failures.append(
+                    f'{name}: p95 {actual["p95_ms"]} мс '
+                    f'(эталон {expected["p95_ms"]} мс)')
+        return failures
+
+    def handle(self, *args, **options):
+        fixtures = self.fixtures()
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(fixtures['user'])
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for name, (auth, requests) in self.scenarios(fixtures).items():
+                if options['only'] and name not in options['only']:
+                    continue
+                client = authenticated if auth else anonymous
+                for mode in options['cache']:
+                    label = name if mode == 'warm' else f'{name}:{mode}'
+                    results[label] = result = self.measure(
+                        client, requests, mode == 'cold', options)
+                    self.stdout.write(
+                        f'{label:<33} p50 {result["p50_ms"]:>8} мс  '
+                        f'p95 {result["p95_ms"]:>8} мс  '
+                        f'SQL {result["queries"]:>3}  '
+                        f'{result["bytes"]:>8} Б')
+
+        report = {
+            'database': connection.vendor,
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        if options['output']:
+            options['output'].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2),
+                encoding='utf-8')
+        if options['baseline']:
+            baseline = json.loads(
+                options['baseline'].read_text(encoding='utf-8'))
+            failures = self.compare(
+                results, baseline, options['latency_tolerance'])
+            if failures:
+                raise CommandError(
+                    'Регрессия производительности:\n' + '\n'.join(failures))
+            self.stdout.write(self.style.SUCCESS(
+                'Результаты в пределах эталона'))
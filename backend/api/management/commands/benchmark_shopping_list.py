@@ -0,0 +1,104 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from user.models import User
+
+FORMATS = ('txt', 'csv', 'json')
+PREFIX = 'benchmark-shopping-list'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время, число SQL-запросов и пиковое потребление '
+            'памяти при выгрузке большого списка покупок. Данные '
+            'создаются во временной транзакции и откатываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=10)
+        parser.add_argument('--max-peak-mib', type=float, default=1.0,
+                            help='Допустимый пик памяти при выгрузке')
+
+    def create_cart(self, options):
+        user = User.objects.create_user(
+            email=f'{PREFIX}@example.com', username=PREFIX,
+            first_name='Benchmark', last_name='Benchmark')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'{PREFIX}-{number}', measurement_unit='г')
+            for number in range(options['ingredients']))
+        if not ingredients[0].pk:
+            ingredients = list(Ingredient.objects.filter(
+                name__startswith=PREFIX).order_by('id'))
+        recipes = [
+            Recipe.objects.create(author=user, name=f'{PREFIX}-{number}',
+                                  text='Описание', cooking_time=10)
+            for number in range(options['recipes'])
+        ]
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (number * options['per_recipe'] + shift)
+                    % len(ingredients)],
+                amount=shift + 1)
+            for number, recipe in enumerate(recipes)
+            for shift in range(options['per_recipe'])
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes)
+        ShoppingListItem.objects.add_recipes(
+            [user.id], [recipe.id for recipe in recipes])
+        return user
+
+    def download(self, client, export_format):
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(
+                    '/api/recipes/download_shopping_cart/',
+                    {'format': export_format})
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        if response.status_code != 200:
+            raise CommandError(
+                f'{export_format}: {response.status_code}')
+        return elapsed, len(context), size, peak / 2 ** 20
+
+    def measure(self, options):
+        user = self.create_cart(options)
+        client = APIClient()
+        client.force_authenticate(user)
+        failures = []
+        self.stdout.write(
+            f'Позиций в списке: '
+            f'{ShoppingListItem.objects.filter(user=user).count()}')
+        for export_format in FORMATS:
+            elapsed, queries, size, peak = self.download(
+                client, export_format)
+            self.stdout.write(
+                f'{export_format:<5} {elapsed:>8.1f} мс  SQL {queries:>2}  '
+                f'{size:>9} Б  пик памяти {peak:.2f} МиБ')
+            if peak > options['max_peak_mib']:
+                failures.append(f'{export_format}: {peak:.2f} МиБ')
+        return failures
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            failures = self.measure(options)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                'Превышен пик памяти:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            'Пик памяти в пределах бюджета'))
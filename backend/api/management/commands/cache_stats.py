@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import cache_is_shared, recipe_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает число попаданий и промахов кэша ответов рецептов'
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                'Счётчики хранятся в LocMemCache каждого процесса и '
+                'недоступны команде. Настройте общий CACHE_BACKEND '
+                'или запросите /api/recipes/cache_stats/ у сервера')
+        stats = recipe_cache_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"] * 100:.1f}%')
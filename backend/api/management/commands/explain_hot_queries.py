@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.plans import FULL_SCANS, full_scans, hot_queries
+from recipes.models import Recipe
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для часто используемых запросов API и '
+            'завершается с ошибкой, если план содержит полное '
+            'сканирование больших таблиц. Запускать на данных '
+            'generate_load_data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы всех запросов')
+
+    def hot_queries(self):
+        user = User.objects.filter(
+            shoppingcarts__isnull=False).order_by('id').first()
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        if not (user and recipe):
+            raise CommandError(
+                'Недостаточно данных: запустите generate_load_data')
+        return hot_queries(user, recipe)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCANS:
+            raise CommandError(
+                f'Анализ планов для {connection.vendor} не поддерживается')
+        failures = []
+        for name, queryset in self.hot_queries().items():
+            plan = queryset.explain()
+            scans = full_scans(plan, connection.vendor)
+            if options['verbose_plans'] or scans:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if scans:
+                failures.append(f'{name}: {", ".join(sorted(scans))}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+        if failures:
+            raise CommandError(
+                'Полное сканирование таблиц:\n' + '\n'.join(failures))
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.benchmark_api import percentile
+
+SERVERS = ('sync', 'gthread', 'gevent')
+DEFAULT_SERVERS = ['sync', 'gthread']
+HOST = '127.0.0.1'
+STARTUP_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('Сервер завершился при запуске')
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('Сервер не запустился')
+
+
+async def fetch(port, path, delay=0):
+    try:
+        reader, writer = await asyncio.open_connection(HOST, port)
+    except OSError:
+        return None
+    try:
+        lines = [f'GET {path} HTTP/1.1', f'Host: {HOST}',
+                 'Connection: close', '']
+        for line in lines:
+            writer.write(f'{line}\r\n'.encode())
+            await writer.drain()
+            if delay:
+                await asyncio.sleep(delay)
+        status_line = await reader.readline()
+        await reader.read()
+    except OSError:
+        return None
+    finally:
+        writer.close()
+    parts = status_line.split()
+    return int(parts[1]) if len(parts) > 1 else None
+
+
+class Command(BaseCommand):
+    help = ('Запускает gunicorn с разными типами воркеров и настройками '
+            'соединений с БД и сравнивает пропускную способность и '
+            'задержки при высокой конкуренции')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='*', choices=SERVERS,
+                            default=DEFAULT_SERVERS)
+        parser.add_argument('--workers', type=int,
+                            help='По умолчанию из gunicorn.conf.py')
+        parser.add_argument('--threads', type=int,
+                            help='По умолчанию из gunicorn.conf.py')
+        parser.add_argument('--conn-max-age', nargs='*', type=int,
+                            default=[None],
+                            help='Значения DB_CONN_MAX_AGE для сравнения')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=100,
+                            help='Запросы для прогрева воркеров, '
+                                 'не входят в результаты')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Клиенты, медленно передающие запрос')
+        parser.add_argument('--slow-delay', type=float, default=0.5,
+                            help='Пауза между строками запроса '
+                                 'медленного клиента, с')
+        parser.add_argument('--paths', nargs='*',
+                            default=['/api/recipes/', '/api/tags/',
+                                     '/api/ingredients/?name=а'])
+        parser.add_argument('--output', type=Path,
+                            help='Файл для сохранения результатов в JSON')
+
+    def server_env(self, server, port, conn_max_age, options):
+        env = dict(os.environ, GUNICORN_WORKER_CLASS=server,
+                   GUNICORN_BIND=f'{HOST}:{port}')
+        for name, value in (('GUNICORN_WORKERS', options['workers']),
+                            ('GUNICORN_THREADS', options['threads']),
+                            ('DB_CONN_MAX_AGE', conn_max_age)):
+            if value is not None:
+                env[name] = str(value)
+        return env
+
+    async def client(self, port, queue, latencies, errors):
+        while not queue.empty():
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            status = await fetch(port, path)
+            if status is None or status >= 500:
+                errors.append(path)
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    async def slow_client(self, port, path, delay):
+        while True:
+            await fetch(port, path, delay)
+
+    def fill_queue(self, paths, count):
+        queue = asyncio.Queue()
+        for number in range(count):
+            queue.put_nowait(paths[number % len(paths)])
+        return queue
+
+    async def load(self, port, options):
+        paths = options['paths']
+        latencies, errors = [], []
+        warmup = self.fill_queue(paths, options['warmup'])
+        await asyncio.gather(*(
+            self.client(port, warmup, [], [])
+            for _ in range(options['concurrency'])
+        ))
+        queue = self.fill_queue(paths, options['requests'])
+        slow = [
+            asyncio.ensure_future(self.slow_client(
+                port, paths[0], options['slow_delay']))
+            for _ in range(options['slow_clients'])
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.client(port, queue, latencies, errors)
+            for _ in range(options['concurrency'])
+        ))
+        elapsed = time.perf_counter() - started
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+        if not latencies:
+            raise CommandError('Ни один запрос не выполнен успешно')
+        return {
+            'rps': round(len(latencies) / elapsed, 1),
+            'errors': len(errors),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+        }
+
+    def run_server(self, server, conn_max_age, options):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn',
+             '--config', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR,
+            env=self.server_env(server, port, conn_max_age, options),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port, process)
+            return asyncio.run(self.load(port, options))
+        finally:
+            process.terminate()
+            process.wait()
+
+    def handle(self, *args, **options):
+        results = {}
+        for server, conn_max_age in product(options['servers'],
+                                            options['conn_max_age']):
+            label = server if conn_max_age is None else (
+                f'{server}, CONN_MAX_AGE={conn_max_age}')
+            results[label] = result = self.run_server(
+                server, conn_max_age, options)
+            self.stdout.write(
+                f'{label}: {result["rps"]} запросов/с, '
+                f'p50={result["p50_ms"]} мс, p95={result["p95_ms"]} мс, '
+                f'p99={result["p99_ms"]} мс, ошибок: {result["errors"]}')
+        if options['output']:
+            options['output'].write_text(
+                json.dumps(results, indent=2, ensure_ascii=False))
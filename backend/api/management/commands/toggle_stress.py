@@ -0,0 +1,55 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.stress import hammer
+from recipes.models import Favorite, Recipe, ShoppingCart
+from user.models import User
+
+ENDPOINTS = {
+    'favorite': Favorite,
+    'shopping_cart': ShoppingCart,
+}
+
+
+class Command(BaseCommand):
+    help = ('Одновременно отправляет запросы добавления и удаления '
+            'рецепта в избранное и список покупок из нескольких потоков '
+            'и проверяет, что ровно один запрос успешен, а счётчики '
+            'совпадают с данными')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def check(self, label, method, statuses, threads):
+        expected = Counter({(method, 200): 1, (method, 400): threads - 1})
+        if statuses != expected:
+            raise CommandError(
+                f'{label}: ожидалось {dict(expected)}, '
+                f'получено {dict(statuses)}')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        user = User.objects.order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        if not (user and recipe):
+            raise CommandError(
+                'Недостаточно данных: запустите generate_load_data')
+        for endpoint, model in ENDPOINTS.items():
+            url = f'/api/recipes/{recipe.id}/{endpoint}/'
+            model.objects.remove(user.id, [recipe.id])
+            for number in range(options['rounds']):
+                for method in ('post', 'delete'):
+                    statuses = hammer(user, [(method, url)] * threads)
+                    self.check(f'{method.upper()} {url} #{number}',
+                               method, statuses, threads)
+            recipe.refresh_from_db()
+            favorites = Favorite.objects.filter(recipe=recipe).count()
+            if recipe.favorites_count != favorites:
+                raise CommandError(
+                    f'favorites_count={recipe.favorites_count}, '
+                    f'в избранном: {favorites}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{url}: {options["rounds"]} раундов по {threads} '
+                'потоков без ошибок'))
@@ -0,0 +1,104 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('foodgram.timing')
+
+
+class QueryTimer:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class RequestTiming:
+
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_db = 0.0
+        self.view_non_db = None
+        self.render_started = None
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+        self.view_db = self.queries.duration
+
+    def finish_view(self):
+        self.render_started = time.perf_counter()
+        view_db = self.queries.duration - self.view_db
+        self.view_non_db = (
+            self.render_started - self.view_started - view_db)
+
+    def metrics(self):
+        finished = time.perf_counter()
+        metrics = {
+            'db': self.queries.duration,
+            'total': finished - self.started,
+        }
+        if self.view_non_db is not None:
+            metrics['view_non_db'] = self.view_non_db
+            metrics['render'] = finished - self.render_started
+        return {name: round(value * 1000, 2)
+                for name, value in metrics.items()}
+
+
+class ServerTimingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        self.log = settings.SERVER_TIMING_LOG
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        timing = request.server_timing = RequestTiming()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timing.queries))
+            response = self.get_response(request)
+        metrics = timing.metrics()
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={value}' + (
+                f';desc="{timing.queries.count} queries"'
+                if name == 'db' else '')
+            for name, value in metrics.items()
+        )
+        if self.log:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timing.queries.count,
+                **metrics,
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'server_timing'):
+            request.server_timing.start_view()
+
+    def process_template_response(self, request, response):
+        if hasattr(request, 'server_timing'):
+            request.server_timing.finish_view()
+        return response
@@ -1,6 +1,71 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = KeysetPagination()
+        self.cursor_paginator.ordering = getattr(
+            view, 'cursor_ordering', KeysetPagination.ordering)
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(KeysetPagination):
+    next_position = None
+
+    def decode_position(self, position):
+        pub_date, _, recipe_id = (position or '').rpartition('|')
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None or not recipe_id.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, int(recipe_id)
+
+    def paginate_feed(self, fetch_page, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = self.decode_position(
+            cursor.position) if cursor is not None else None
+        rows = fetch_page(before, self.page_size + 1)
+        if len(rows) > self.page_size:
+            pub_date, recipe_id = rows[self.page_size - 1]
+            self.next_position = f'{pub_date.isoformat()}|{recipe_id}'
+        return [recipe_id for _, recipe_id in rows[:self.page_size]]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
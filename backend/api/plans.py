@@ -0,0 +1,65 @@
+import re
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Sum
+
+from recipes.models import (FeedEntry, Favorite, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from user.models import Subscription
+
+FULL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)(.*)'),
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)(.*)'),
+}
+NOT_TABLES = {'CONSTANT'}
+SMALL_TABLES = {Tag._meta.db_table}
+
+
+def full_scans(plan, vendor):
+    pattern = FULL_SCANS[vendor]
+    matches = filter(None, map(pattern.search, plan.splitlines()))
+    return {
+        match.group(1) for match in matches
+        if 'INDEX' not in match.group(2)
+    } - NOT_TABLES - SMALL_TABLES
+
+
+def hot_queries(user, recipe):
+    tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+    cart = IngredientRecipe.objects.filter(
+        recipe__in=ShoppingCart.objects.filter(user=user).values('recipe'))
+    return {
+        'recipes_page': Recipe.objects.only(
+            'id', 'pub_date').order_by('-pub_date', '-id')[:6],
+        'recipes_by_author': Recipe.objects.filter(
+            author=recipe.author_id).order_by('-pub_date')[:6],
+        'recipes_by_tags': Recipe.objects.filter(
+            Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=tag_ids))
+        ).order_by('-pub_date', '-id')[:6],
+        'recipes_with_flags': Recipe.objects.with_user_flags(
+            user).order_by('-pub_date', '-id')[:6],
+        'favorite_lookup': Favorite.objects.filter(
+            user=user, recipe=recipe),
+        'favorites_recent': Favorite.objects.filter(
+            user=user).order_by('-added_at')[:6],
+        'shopping_cart_lookup': ShoppingCart.objects.filter(
+            user=user, recipe=recipe),
+        'shopping_cart_recent': ShoppingCart.objects.filter(
+            user=user).order_by('-added_at')[:6],
+        'subscription_lookup': Subscription.objects.filter(
+            user=user, author=recipe.author_id),
+        'feed_entries': FeedEntry.objects.filter(
+            user=user).order_by('-pub_date', '-recipe_id')[:6],
+        'feed_popular_authors': Recipe.objects.filter(
+            author__in=Subscription.objects.filter(
+                user=user,
+                author__subscribers_count__gte=settings.FEED_FANOUT_LIMIT
+            ).values('author')).order_by('-pub_date', '-id')[:6],
+        'shopping_cart_totals': cart.values('ingredient').annotate(
+            total=Sum('amount')).order_by(),
+        'shopping_list_download': ShoppingListItem.objects.filter(
+            user=user).values(
+                'ingredient__name', 'total_amount').order_by(
+                    'ingredient__name'),
+    }
@@ -1,10 +1,12 @@
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
 
+from recipes.constants import MAX_BATCH_SIZE, PANTRY_SEARCH_LIMIT
 from recipes.models import (Ingredient, IngredientRecipe, Favorite,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
 from user.models import Subscription, User
 
 
@@ -28,6 +30,8 @@ class CustomUserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
@@ -38,7 +42,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
 class SubscriptionSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -48,6 +52,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                             'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         user = request.user
         if user.is_anonymous:
@@ -56,17 +62,37 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'recipe_previews'):
+            recipes = obj.recipe_previews
+        else:
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
 
         return RecipeMinifiedSerializer(
             recipes, many=True, context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_BATCH_SIZE,
+        default=PANTRY_SEARCH_LIMIT
+    )
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -121,18 +147,27 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return not user.is_anonymous and Favorite.objects.filter(
             user=user,
             recipe=obj).exists()
 
     def get_ingredients(self, obj):
-        ingredients = IngredientRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredientrecipe_set.all()
         serializer = IngredentRecipeSerializer(ingredients, many=True)
         return serializer.data
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return not user.is_anonymous and ShoppingCart.objects.filter(
             user=user,
@@ -195,6 +230,43 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ))
         IngredientRecipe.objects.bulk_create(ingredients)
 
+    def update_ingredients(self, recipe, ingredients_data):
+        stored = {
+            row.ingredient_id: row
+            for row in recipe.ingredientrecipe_set.all()
+        }
+        submitted = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        removed = stored.keys() - submitted.keys()
+        added = [
+            ingredient_data for ingredient_data in ingredients_data
+            if ingredient_data['id'] not in stored
+        ]
+        changed = []
+        for ingredient_id, row in stored.items():
+            amount = submitted.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if not (removed or added or changed):
+            return
+        if removed:
+            recipe.ingredientrecipe_set.filter(
+                ingredient_id__in=removed).delete()
+        if not (added or changed):
+            return
+        user_ids = list(recipe.shoppingcarts.values_list(
+            'user_id', flat=True))
+        ShoppingListItem.objects.remove_recipes(user_ids, [recipe.id])
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            self.create_ingredients(recipe, added)
+        ShoppingListItem.objects.add_recipes(user_ids, [recipe.id])
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context['request'].user
         ingredients_data = validated_data.pop('ingredients')
@@ -204,14 +276,14 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         if tags is not None:
             instance.tags.set(tags)
         ingredients_data = validated_data.pop('ingredients', None)
         if ingredients_data is not None:
-            instance.ingredients.clear()
-            self.create_ingredients(instance, ingredients_data)
+            self.update_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
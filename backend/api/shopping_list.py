@@ -0,0 +1,67 @@
+import csv
+import json
+
+from django.utils import timezone
+
+CHUNK_SIZE = 100
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def chunked(lines, size=CHUNK_SIZE):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def txt_lines(ingredients):
+    today = timezone.localdate()
+    yield ('Список покупок:\n\n'
+           f'Дата: {today:%Y-%m-%d}\n\n')
+    for ingredient in ingredients:
+        yield (f'- {ingredient["ingredient__name"]} '
+               f'({ingredient["ingredient__measurement_unit"]})'
+               f' : {ingredient["quantity"]}\n')
+
+
+def csv_lines(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['quantity'],
+        ))
+
+
+def json_lines(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['quantity'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+EXPORTERS = {
+    'txt': txt_lines,
+    'csv': csv_lines,
+    'json': json_lines,
+}
+
+
+def stream_shopping_list(ingredients, export_format):
+    return chunked(EXPORTERS[export_format](ingredients))
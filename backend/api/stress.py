@@ -0,0 +1,32 @@
+import threading
+from collections import Counter
+
+from django.db import connection
+from rest_framework.test import APIClient
+
+
+def hammer(user, requests):
+    barrier = threading.Barrier(len(requests))
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker(method, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        barrier.wait()
+        try:
+            status = getattr(client, method)(url).status_code
+        except Exception:
+            status = 500
+        finally:
+            connection.close()
+        with lock:
+            statuses[method, status] += 1
+
+    workers = [threading.Thread(target=worker, args=request)
+               for request in requests]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return statuses
@@ -0,0 +1,752 @@
+import json
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.stress import hammer
+from recipes.autocomplete import ingredient_index
+from recipes.factories import (create_ingredients, create_recipe,
+                               create_recipes, create_tags, create_user)
+from recipes.models import (CacheVersion, Favorite, FeedEntry, Ingredient,
+                            Recipe, ShoppingCart, Tag)
+from recipes.pantry import pantry_index
+from user.models import Subscription, User
+
+
+class RecipeListQueriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        create_recipes(cls.user, 60)
+
+    def assert_list_queries(self, client, queries):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_list_queries(client, 7)
+
+    def test_anonymous_list(self):
+        self.assert_list_queries(APIClient(), 7)
+
+
+class SubscriptionsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_page_with_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.recipes = create_recipes(cls.user, 10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_stay_stable_when_recipes_are_added(self):
+        response = self.client.get('/api/recipes/', {'cursor': '', 'limit': 4})
+        self.assertNotIn('count', response.data)
+        seen = [recipe['id'] for recipe in response.data['results']]
+        newcomer = create_user('newcomer')
+        for _ in range(3):
+            create_recipe(newcomer)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertLessEqual(len(response.data['results']), 4)
+            seen += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(
+            seen, [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/api/recipes/', {'limit': 4})
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class RecipeSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('cook')
+        cls.soup, cls.pie = create_tags(2)
+        create_recipe(cls.author, tags=[cls.soup], name='Борщ',
+                      text='Свекла, капуста и картофель')
+        create_recipe(cls.author, tags=[cls.soup], name='Капуста тушеная',
+                      text='Капуста и морковь')
+        create_recipe(cls.author, tags=[cls.pie], name='Пирог с капустой',
+                      text='Тесто и капуста')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            '/api/recipes/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_name_ranks_above_text(self):
+        self.assertEqual(self.search('капуста')[0], 'Капуста тушеная')
+        self.assertEqual(
+            set(self.search('капуста')),
+            {'Борщ', 'Капуста тушеная', 'Пирог с капустой'})
+
+    def test_combined_with_tag_filter(self):
+        self.assertEqual(
+            self.search('капуста', tags=self.pie.slug), ['Пирог с капустой'])
+        self.assertEqual(
+            set(self.search('капуста', tags=self.soup.slug)),
+            {'Борщ', 'Капуста тушеная'})
+
+    def test_follows_recipe_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, name='Солянка', text='Мясо')
+        self.assertEqual(self.search('солянка'), ['Солянка'])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Рассольник'
+            recipe.save()
+        self.assertEqual(self.search('солянка'), [])
+        self.assertEqual(self.search('рассольник'), ['Рассольник'])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(self.search('рассольник'), [])
+
+
+class RecipeFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.recipes = create_recipes(cls.user, 6)
+        cls.tags = list(Tag.objects.order_by('slug'))
+        for recipe in cls.recipes[:2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def filter(self, **params):
+        response = self.client.get('/api/recipes/', {'limit': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(response.data['count'], len(ids))
+        return ids
+
+    def expected(self, recipes):
+        return sorted((recipe.id for recipe in recipes), reverse=True)
+
+    def test_any_of_selected_tags(self):
+        for count in range(1, len(self.tags) + 1):
+            tags = self.tags[:count]
+            with self.subTest(tags=count):
+                self.assertEqual(
+                    self.filter(tags=[tag.slug for tag in tags]),
+                    self.expected(Recipe.objects.filter(
+                        tags__in=tags).distinct()))
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get('/api/recipes/', {'tags': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_tag_is_accepted(self):
+        self.filter(tags=self.tags[0].slug)
+        tag = Tag.objects.create(name='Новый', color='#FFFFFF', slug='new')
+        self.recipes[0].tags.add(tag)
+        self.assertEqual(self.filter(tags='new'), [self.recipes[0].id])
+
+    def test_user_relations(self):
+        self.assertEqual(self.filter(is_favorited=1),
+                         self.expected(self.recipes[:2]))
+        self.assertEqual(self.filter(is_in_shopping_cart=1),
+                         [self.recipes[1].id])
+        self.assertEqual(
+            self.filter(is_favorited=1, is_in_shopping_cart=1,
+                        tags=[tag.slug for tag in self.tags]),
+            [self.recipes[1].id])
+
+    def test_queries_do_not_grow_with_tags(self):
+        queries = []
+        for count in range(1, len(self.tags) + 1):
+            self.filter(tags=[tag.slug for tag in self.tags[:count]])
+            with CaptureQueriesContext(connection) as context:
+                self.filter(tags=[tag.slug for tag in self.tags[:count]])
+            queries.append(len(context))
+        self.assertEqual(len(set(queries)), 1)
+
+
+@override_settings(CACHE_VERSIONS_STORE='database')
+class RecipeConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('cook')
+        cls.recipe = create_recipes(cls.author, 1)[0]
+        past = timezone.now() - timedelta(hours=1)
+        Recipe.objects.update(updated_at=past)
+        CacheVersion.objects.update(updated_at=past)
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def test_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_author_change_moves_last_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Шеф'
+            self.author.save()
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['first_name'], 'Шеф')
+
+
+class IngredientAutocompleteTests(TestCase):
+    names = ('ванильный сахар', 'сахар', 'соль', 'сахарная пудра',
+             'тростниковый сахар')
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in cls.names:
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.snapshot = None
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        for backend in ('memory', 'database'):
+            with self.subTest(backend=backend), override_settings(
+                    INGREDIENT_SEARCH_BACKEND=backend):
+                self.assertEqual(self.search('сах'), [
+                    'сахар', 'сахарная пудра',
+                    'ванильный сахар', 'тростниковый сахар',
+                ])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=3)
+    def test_result_cap(self):
+        self.assertEqual(
+            self.search('Сах'),
+            ['сахар', 'сахарная пудра', 'ванильный сахар'])
+
+    def test_index_follows_catalogue_changes(self):
+        self.assertEqual(self.search('соль'), ['соль'])
+        Ingredient.objects.create(name='соль морская', measurement_unit='г')
+        self.assertEqual(self.search('соль'), ['соль', 'соль морская'])
+
+
+class PantryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('cook')
+        cls.ingredients = create_ingredients(4)
+        first, second, third, fourth = cls.ingredients
+        cls.pair = create_recipe(
+            cls.author, {first: 1, second: 1}, name='Пара')
+        cls.trio = create_recipe(
+            cls.author, {first: 1, second: 1, third: 1}, name='Трио')
+        cls.other = create_recipe(cls.author, {fourth: 1}, name='Другое')
+
+    def setUp(self):
+        cache.clear()
+        pantry_index.version = None
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def search(self, *ingredients):
+        response = self.client.get('/api/recipes/pantry/', {
+            'ingredients': [ingredient.id for ingredient in ingredients]})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['name'], recipe['matched'], recipe['missing'])
+                for recipe in response.data]
+
+    def test_ranks_by_coverage(self):
+        first, second, third, _ = self.ingredients
+        self.assertEqual(self.search(first, second), [
+            ('Пара', 2, 0), ('Трио', 2, 1)])
+        self.assertEqual(self.search(first, second, third), [
+            ('Трио', 3, 0), ('Пара', 2, 0)])
+
+    def test_refresh_follows_recipe_changes(self):
+        first, second, third, fourth = self.ingredients
+        self.search(first)
+        built_at = pantry_index.built_at
+        deleted_id = self.other.id
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, {first: 1}, name='Одиночка')
+            self.other.delete()
+        self.assertEqual(self.search(first, fourth), [
+            ('Одиночка', 1, 0), ('Пара', 1, 1), ('Трио', 1, 2)])
+        self.assertNotIn(deleted_id, pantry_index.recipe_ingredients)
+        self.assertEqual(pantry_index.built_at, built_at)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.pair.id}/',
+                {'ingredients': [{'id': third.id, 'amount': 1}]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search(first, second), [
+            ('Одиночка', 1, 0), ('Трио', 2, 1)])
+        self.assertEqual(self.search(third)[0], ('Пара', 1, 0))
+
+
+class RecipeUpdateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('cook')
+        cls.buyer = create_user('buyer')
+        cls.ingredients = create_ingredients(4)
+        first, second, third, _ = cls.ingredients
+        cls.recipe = create_recipe(
+            cls.author, {first: 1, second: 2, third: 3})
+        ShoppingCart.objects.create(user=cls.buyer, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def rows(self):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in self.recipe.ingredientrecipe_set.all()
+        }
+
+    def test_ingredients_are_diffed(self):
+        first, second, third, fourth = self.ingredients
+        before = self.rows()
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {'ingredients': [{'id': second.id, 'amount': 2},
+                             {'id': third.id, 'amount': 5},
+                             {'id': fourth.id, 'amount': 4}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        after = self.rows()
+        self.assertEqual(set(after), {second.id, third.id, fourth.id})
+        self.assertEqual(after[second.id], before[second.id])
+        self.assertEqual(after[third.id], (before[third.id][0], 5))
+        self.assertEqual(after[fourth.id][1], 4)
+        self.assertNotIn(after[fourth.id][0], {
+            pk for pk, _ in before.values()})
+        call_command('rebuild_shopping_lists', check=True, stdout=StringIO())
+
+    def test_unchanged_ingredients_are_not_written(self):
+        before = self.rows()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {'ingredients': [
+                    {'id': ingredient.id, 'amount': amount}
+                    for ingredient, amount in zip(self.ingredients, (1, 2, 3))
+                ]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rows(), before)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'recipes_ingredientrecipe' in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ])
+
+
+class BatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.authors = [create_user(f'cook{number}') for number in range(20)]
+        cls.recipes = create_recipes(cls.authors[0], 20)
+        cls.missing = cls.authors[-1].id + cls.recipes[-1].id
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(result['id'], result['status'])
+                for result in response.data['results']]
+
+    def assert_counters(self):
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count())
+        call_command('rebuild_shopping_lists', check=True, stdout=StringIO())
+
+    def test_partial_failure_and_duplicates(self):
+        first, second, third = (recipe.id for recipe in self.recipes[:3])
+        for endpoint, model in (('favorite', Favorite),
+                                ('shopping_cart', ShoppingCart)):
+            url = f'/api/recipes/{endpoint}/'
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(self.batch('post', url, [second]),
+                                 [(second, 200)])
+                self.assertEqual(
+                    self.batch('post', url,
+                               [first, second, first, self.missing]),
+                    [(first, 200), (second, 400), (self.missing, 404)])
+                self.assertEqual(set(model.objects.filter(
+                    user=self.user).values_list('recipe_id', flat=True)),
+                    {first, second})
+                self.assert_counters()
+                self.assertEqual(
+                    self.batch('delete', url, [third, first, first]),
+                    [(third, 400), (first, 200)])
+                self.assert_counters()
+
+    def test_subscribe_batch(self):
+        author, other = (user.id for user in self.authors[:2])
+        url = '/api/users/subscribe/'
+        self.assertEqual(
+            self.batch('post', url, [author, self.user.id, author,
+                                     self.missing]),
+            [(author, 201), (self.user.id, 400), (self.missing, 404)])
+        self.assertFalse(Subscription.objects.filter(
+            user=self.user, author=self.user).exists())
+        self.assertEqual(self.batch('delete', url, [other, author]),
+                         [(other, 400), (author, 204)])
+        self.assertEqual(User.objects.get(pk=author).subscribers_count, 0)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        recipe_ids = [recipe.id for recipe in self.recipes]
+        author_ids = [author.id for author in self.authors]
+        for url, ids in (('/api/recipes/favorite/', recipe_ids),
+                         ('/api/recipes/shopping_cart/', recipe_ids),
+                         ('/api/users/subscribe/', author_ids)):
+            for method in ('post', 'delete'):
+                with self.subTest(url=url, method=method):
+                    queries = []
+                    for batch in (ids[:2], ids[2:]):
+                        with CaptureQueriesContext(connection) as context:
+                            self.batch(method, url, batch)
+                        queries.append(len(context))
+                    self.assertEqual(queries[0], queries[1])
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.fan = create_user('fan')
+        cls.cook = create_user('cook')
+        cls.star = create_user('star')
+        for author in (cls.cook, cls.star):
+            for number in range(3):
+                create_recipe(author, name=f'{author.username} {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, user, author, method='post'):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = getattr(client, method)(
+            f'/api/users/{author.id}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def entries(self, author):
+        return set(FeedEntry.objects.filter(
+            user=self.reader, author=author).values_list(
+                'recipe_id', flat=True))
+
+    def recipe_ids(self, author):
+        return set(author.recipes.values_list('id', flat=True))
+
+    def feed(self, limit):
+        ids = []
+        response = self.client.get('/api/recipes/feed/', {'limit': limit})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_backfill_fanout_and_prune(self):
+        self.subscribe(self.reader, self.cook)
+        self.assertEqual(self.entries(self.cook), self.recipe_ids(self.cook))
+        recipe = create_recipe(self.cook, name='Новый')
+        self.assertIn(recipe.id, self.entries(self.cook))
+        self.subscribe(self.reader, self.cook, 'delete')
+        self.assertEqual(self.entries(self.cook), set())
+        self.assertEqual(self.feed(10), [])
+
+    def test_popular_author_is_read_on_demand(self):
+        self.subscribe(self.fan, self.star)
+        self.subscribe(self.reader, self.star)
+        recipe = create_recipe(self.star, name='Новый')
+        self.assertNotIn(recipe.id, self.entries(self.star))
+        self.assertIn(recipe.id, self.feed(10))
+        self.subscribe(self.fan, self.star, 'delete')
+        self.assertEqual(self.entries(self.star), self.recipe_ids(self.star))
+
+    def test_order_and_paging_match_orm(self):
+        self.subscribe(self.fan, self.star)
+        for author in (self.cook, self.star):
+            self.subscribe(self.reader, author)
+        create_recipe(self.cook, name='Новый')
+        expected = list(Recipe.objects.filter(
+            author__in=(self.cook, self.star)).order_by(
+                '-pub_date', '-id').values_list('id', flat=True))
+        for limit in (1, 2, 3, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.feed(limit), expected)
+
+
+class CatalogueCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes(create_user('cook'), 1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified(self):
+        for url in ('/api/tags/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('max-age=', response['Cache-Control'])
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_change_moves_etag(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        Tag.objects.create(name='Десерт', color='#FFFFFF', slug='dessert')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dessert', [tag['slug'] for tag in response.json()])
+
+
+class RecipeCacheStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.admin = create_user('admin', is_staff=True)
+        cls.recipe = create_recipes(cls.user, 2)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/recipes/cache_stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_anonymous_hits_and_misses(self):
+        viewer = APIClient()
+        viewer.force_authenticate(self.user)
+        anonymous = APIClient()
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.id}/'):
+            self.assertEqual(anonymous.get(url)['X-Cache'], 'MISS')
+            self.assertEqual(anonymous.get(url)['X-Cache'], 'HIT')
+            self.assertNotIn('X-Cache', viewer.get(url))
+        anonymous.get('/api/recipes/', {'limit': 1})
+        self.assertEqual(self.stats(), {
+            'hits': 2, 'misses': 3, 'hit_ratio': 0.4, 'shared': False,
+        })
+
+    def test_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/recipes/cache_stats/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_refuses_process_local_counters(self):
+        with self.assertRaisesMessage(CommandError, 'LocMemCache'):
+            call_command('cache_stats', stdout=StringIO())
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_command_reads_shared_counters(self):
+        stdout = StringIO()
+        call_command('cache_stats', stdout=stdout)
+        self.assertIn('Попаданий: 0, промахов: 0', stdout.getvalue())
+
+
+class ServerTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        create_recipes(cls.user, 3)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, SERVER_TIMING_LOG=True)
+    def test_sampled_request(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertLogs('foodgram.timing') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/recipes/')
+        metrics = dict(
+            entry.split(';', 1) for entry in
+            response['Server-Timing'].split(', '))
+        self.assertEqual(
+            set(metrics), {'db', 'view_non_db', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics['db'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['queries'], len(queries))
+        self.assertEqual(line['path'], '/api/recipes/')
+        self.assertIn('view_non_db', line)
+
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+
+
+class ToggleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.recipe = create_recipes(cls.user, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_statuses_and_counters(self):
+        missing = Recipe.objects.order_by('id').last().id + 1
+        for endpoint, model in (('favorite', Favorite),
+                                ('shopping_cart', ShoppingCart)):
+            url = f'/api/recipes/{self.recipe.id}/{endpoint}/'
+            for method, status, rows in (('post', 200, 1), ('post', 400, 1),
+                                         ('delete', 200, 0),
+                                         ('delete', 400, 0)):
+                with self.subTest(endpoint=endpoint, method=method,
+                                  status=status):
+                    response = getattr(self.client, method)(url)
+                    self.assertEqual(response.status_code, status)
+                    self.assertEqual(model.objects.filter(
+                        user=self.user, recipe=self.recipe).count(), rows)
+                    self.recipe.refresh_from_db()
+                    self.assertEqual(
+                        self.recipe.favorites_count,
+                        Favorite.objects.filter(recipe=self.recipe).count())
+                    call_command('rebuild_shopping_lists', check=True,
+                                 stdout=StringIO())
+            for method in ('post', 'delete'):
+                response = getattr(self.client, method)(
+                    f'/api/recipes/{missing}/{endpoint}/')
+                self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Переключение выполняется через INSERT ... ON CONFLICT '
+            'и проверяется на PostgreSQL')
+class ConcurrentToggleTests(TransactionTestCase):
+    threads = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('cook')
+        self.recipe = create_recipes(self.user, 1)[0]
+
+    def assert_consistent(self, model):
+        rows = model.objects.filter(user=self.user, recipe=self.recipe)
+        self.assertLessEqual(rows.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.favorites_count,
+            Favorite.objects.filter(recipe=self.recipe).count())
+        call_command('rebuild_shopping_lists', check=True, stdout=StringIO())
+
+    def test_same_toggle_wins_once(self):
+        for endpoint, model in (('favorite', Favorite),
+                                ('shopping_cart', ShoppingCart)):
+            url = f'/api/recipes/{self.recipe.id}/{endpoint}/'
+            for method in ('post', 'delete'):
+                with self.subTest(endpoint=endpoint, method=method):
+                    statuses = hammer(
+                        self.user, [(method, url)] * self.threads)
+                    self.assertEqual(statuses, Counter({
+                        (method, 200): 1,
+                        (method, 400): self.threads - 1,
+                    }))
+                    self.assert_consistent(model)
+
+    def test_interleaved_toggles(self):
+        for endpoint, model in (('favorite', Favorite),
+                                ('shopping_cart', ShoppingCart)):
+            url = f'/api/recipes/{self.recipe.id}/{endpoint}/'
+            for _ in range(3):
+                with self.subTest(endpoint=endpoint):
+                    statuses = hammer(self.user, [
+                        ('post', url), ('delete', url),
+                    ] * (self.threads // 2))
+                    self.assertNotIn(500, {
+                        status for _, status in statuses})
+                    self.assert_consistent(model)
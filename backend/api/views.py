@@ -1,29 +1,62 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, F, Prefetch, Value,
+                              prefetch_related_objects)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.viewsets import (ModelViewSet, ReadOnlyModelViewSet)
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from api.cache import (CatalogueCacheMixin, RecipeCacheMixin, profile_etag,
+                       recipe_cache_stats, render_recipes)
 from api.filters import IngredientFilter, RecipeFilter
-from api.serializers import (CustomUserCreateSerializer, CustomUserSerializer,
-                             IngredientSerializer, RecipeCreateSerializer,
+from api.serializers import (BatchSerializer, CustomUserCreateSerializer,
+                             CustomUserSerializer, IngredientSerializer,
+                             PantrySerializer, RecipeCreateSerializer,
                              RecipeSerializer, SubscriptionSerializer,
                              TagSerializer)
-from api.pagination import CustomPagination
+from api.pagination import CustomPagination, FeedPagination
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from recipes.models import (Ingredient, IngredientRecipe, Favorite, Recipe,
-                            ShoppingCart, Tag)
+from api.renderers import CSVRenderer, PlainTextRenderer
+from api.shopping_list import stream_shopping_list
+from recipes.autocomplete import ingredient_index
+from recipes.pantry import pantry_index
+from recipes.models import (FeedEntry, Ingredient, Favorite, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
 from user.models import Subscription, User
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+def batch_ids(request):
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return list(dict.fromkeys(serializer.validated_data['ids']))
+
+
+def batch_results(ids, changed, existing, messages):
+    results = []
+    for pk in ids:
+        if pk in changed:
+            outcome = 'changed'
+        elif pk in existing:
+            outcome = 'unchanged'
+        else:
+            outcome = 'missing'
+        code, message = messages[outcome]
+        results.append({'id': pk, 'status': code, 'message': message})
+    return Response({'results': results})
+
+
+class IngredientViewSet(CatalogueCacheMixin, ReadOnlyModelViewSet):
+    catalogue_name = 'ingredients'
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
@@ -31,20 +64,32 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_BACKEND == 'memory':
+            return Response(ingredient_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT))
+        return super().list(request, *args, **kwargs)
+
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, ReadOnlyModelViewSet):
+    catalogue_name = 'tags'
     queryset = Tag.objects.all()
     pagination_class = None
     serializer_class = TagSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
 
-class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(RecipeCacheMixin, ModelViewSet):
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        return Recipe.objects.with_user_flags(
+            self.request.user).with_related()
 
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
@@ -54,29 +99,35 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save()
 
+    @transaction.atomic
     def post_delete(self, request, pk, model):
-        recipe = self.get_object()
-        model_filter = model.objects.filter(
-            user=request.user, recipe=recipe)
+        recipe_id = int(pk) if pk.isdigit() else None
+        user_id = request.user.id
 
         if request.method == 'POST':
-            if model_filter.exists():
+            if model.objects.add(user_id, [recipe_id]):
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.add_recipes(
+                        [user_id], [recipe_id])
                 return Response(
-                    {'message': 'Рецепт уже был добавлен'},
-                    status=status.HTTP_400_BAD_REQUEST
+                    {'message': 'Рецепт добавлен'},
+                    status=status.HTTP_200_OK
                 )
-            model.objects.create(user=request.user, recipe=recipe)
+            get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
             return Response(
-                {'message': 'Рецепт добавлен'},
-                status=status.HTTP_200_OK
+                {'message': 'Рецепт уже был добавлен'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        if model_filter.exists():
-            model_filter.delete()
+        if model.objects.remove(user_id, [recipe_id]):
+            if model is ShoppingCart:
+                ShoppingListItem.objects.remove_recipes(
+                    [user_id], [recipe_id])
             return Response(
                 {'message': 'Рецепт удален'},
                 status=status.HTTP_200_OK
             )
+        get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
         return Response(
             {'message': 'Данный рецепт отсутствует'},
             status=status.HTTP_400_BAD_REQUEST
@@ -94,35 +145,117 @@ class RecipeViewSet(ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self.post_delete(request, pk, ShoppingCart)
 
+    @transaction.atomic
+    def post_delete_batch(self, request, model):
+        recipe_ids = batch_ids(request)
+        user_id = request.user.id
+        if request.method == 'POST':
+            changed = set(model.objects.add(user_id, recipe_ids))
+            if changed and model is ShoppingCart:
+                ShoppingListItem.objects.add_recipes([user_id], changed)
+            messages = {
+                'changed': (status.HTTP_200_OK, 'Рецепт добавлен'),
+                'unchanged': (status.HTTP_400_BAD_REQUEST,
+                              'Рецепт уже был добавлен'),
+            }
+        else:
+            changed = set(model.objects.remove(user_id, recipe_ids))
+            if changed and model is ShoppingCart:
+                ShoppingListItem.objects.remove_recipes([user_id], changed)
+            messages = {
+                'changed': (status.HTTP_200_OK, 'Рецепт удален'),
+                'unchanged': (status.HTTP_400_BAD_REQUEST,
+                              'Данный рецепт отсутствует'),
+            }
+        messages['missing'] = (status.HTTP_404_NOT_FOUND,
+                               'Рецепт не найден')
+        unresolved = set(recipe_ids) - changed
+        existing = set(Recipe.objects.filter(
+            pk__in=unresolved).values_list('id', flat=True)) if (
+                unresolved) else set()
+        return batch_results(recipe_ids, changed, existing, messages)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='favorite',
+            url_name='favorite-batch',
+            permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.post_delete_batch(request, Favorite)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            url_path='shopping_cart',
+            url_name='shopping-cart-batch',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.post_delete_batch(request, ShoppingCart)
+
     @action(detail=False,
             methods=['get'],
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_feed(
+            lambda before, limit: FeedEntry.objects.page(
+                request.user, before, limit),
+            request)
+        return paginator.get_paginated_response(
+            render_recipes(recipe_ids, request))
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(recipe_cache_stats())
+
+    @action(detail=False, methods=['get'])
+    def pantry(self, request):
+        data = {'ingredients': request.query_params.getlist('ingredients')}
+        if 'limit' in request.query_params:
+            data['limit'] = request.query_params['limit']
+        serializer = PantrySerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        matches = pantry_index.search(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['limit'])
+        recipes = {
+            recipe['id']: recipe for recipe in render_recipes(
+                [recipe_id for recipe_id, _, _ in matches], request)
+        }
+        return Response([
+            {**recipes[recipe_id], 'matched': matched,
+             'missing': total - matched,
+             'coverage': round(matched / total, 3)}
+            for recipe_id, matched, total in matches
+            if recipe_id in recipes
+        ])
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        recipes = ShoppingCart.objects.filter(
-            user=request.user).values('recipe__id')
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__in=recipes).values(
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user).values(
                 'ingredient__name',
-                'ingredient__measurement_unit').annotate(
-                    quantity=Sum('amount'))
-        today = timezone.localdate()
-        content = ('Список покупок:\n\n'
-                   f'Дата: {today:%Y-%m-%d}\n\n')
-        for ingredient in ingredients:
-            content += '\n'.join([
-                f'- {ingredient["ingredient__name"]} '
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f' : {ingredient["quantity"]}\n'
-            ])
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_cart.txt"')
+                'ingredient__measurement_unit',
+                quantity=F('total_amount')).order_by(
+                    'ingredient__name').iterator()
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            stream_shopping_list(ingredients, renderer.format),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
         return response
 
 
 class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     pagination_class = CustomPagination
+    cursor_ordering = ('username',)
     serializer_class = CustomUserSerializer
     permission_classes = (AllowAny,)
 
@@ -140,21 +273,43 @@ class CustomUserViewSet(UserViewSet):
     def subscriptions(self, request):
         user_subscriptions = Subscription.objects.filter(user=request.user)
         author_ids = user_subscriptions.values_list('author_id', flat=True)
-        queryset = User.objects.filter(pk__in=author_ids)
+        queryset = User.objects.filter(pk__in=author_ids).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()))
         paginated_queryset = self.paginate_queryset(queryset)
+        self.prefetch_recipe_previews(paginated_queryset)
         serializer = self.get_serializer(paginated_queryset, many=True)
         return self.get_paginated_response(serializer.data)
 
-    @action(detail=False,
-            methods=['get'],
-            url_path='me',
-            url_name='me')
-    def my_profile(self, request):
+    def prefetch_recipe_previews(self, authors):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit:
+            if not recipes_limit.isdigit():
+                raise ValidationError(
+                    {'recipes_limit': ['Ожидается целое число']})
+            recipes = recipes.latest_per_author(
+                [author.id for author in authors], int(recipes_limit))
+        prefetch_related_objects(
+            authors,
+            Prefetch('recipes', queryset=recipes, to_attr='recipe_previews')
+        )
+
+    @action(['get', 'put', 'patch', 'delete'], detail=False)
+    def me(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return super().me(request, *args, **kwargs)
         if not request.user.is_authenticated:
             return Response(
                 {'detail': 'Пользователь не авторизован'}, status=401)
-        serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        etag = profile_etag(request.user)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            serializer = self.get_serializer(request.user)
+            response = Response(serializer.data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
 
     @action(
         detail=True,
@@ -192,6 +347,49 @@ class CustomUserViewSet(UserViewSet):
             user=user, author=author).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        url_name='subscribe-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic
+    def subscribe_batch(self, request):
+        author_ids = batch_ids(request)
+        user_id = request.user.id
+        if request.method == 'POST':
+            changed = set(Subscription.objects.add(user_id, author_ids))
+            FeedEntry.objects.materialize(
+                user_ids=[user_id], author_ids=list(changed))
+            messages = {
+                'changed': (status.HTTP_201_CREATED, 'Подписка оформлена'),
+                'unchanged': (status.HTTP_400_BAD_REQUEST,
+                              'Вы уже подписаны на данного автора'),
+            }
+        else:
+            changed = set(Subscription.objects.remove(user_id, author_ids))
+            if changed:
+                FeedEntry.objects.prune(user_id, changed)
+            messages = {
+                'changed': (status.HTTP_204_NO_CONTENT,
+                            'Подписка отменена'),
+                'unchanged': (status.HTTP_400_BAD_REQUEST,
+                              'Вы не подписаны на данного автора'),
+            }
+        messages['missing'] = (status.HTTP_404_NOT_FOUND,
+                               'Пользователь не найден')
+        unresolved = set(author_ids) - changed
+        existing = set(User.objects.filter(
+            pk__in=unresolved).values_list('id', flat=True)) if (
+                unresolved) else set()
+        response = batch_results(author_ids, changed, existing, messages)
+        for result in response.data['results']:
+            if result['id'] == user_id:
+                result['status'] = status.HTTP_400_BAD_REQUEST
+                result['message'] = 'Подписка на себя невозможна'
+        return response
+
     @action(detail=False, methods=['post'])
     def set_password(self, request):
         current_password = request.data.get('current_password')
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', default='gthread')
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(
+        f'Неизвестный GUNICORN_WORKER_CLASS={worker_class!r}, '
+        f'допустимые значения: {", ".join(WORKER_CLASSES)}')
+
+cpu_count = multiprocessing.cpu_count()
+
+wsgi_app = 'foodgram.wsgi:application'
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+threads = int(os.getenv(
+    'GUNICORN_THREADS', default=4 if worker_class == 'gthread' else 1))
+# Каждый поток держит своё соединение с PostgreSQL, поэтому
+# workers * threads не должно превышать GUNICORN_DB_CONNECTIONS
+# (по умолчанию 80 из max_connections=100 PostgreSQL, остальное
+# остаётся для миграций, cron и ручных подключений).
+db_connections = int(os.getenv('GUNICORN_DB_CONNECTIONS', default=80))
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    default=max(1, min(cpu_count * 2 + 1, db_connections // threads))))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS',
+                                   default=100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+
+if worker_class == 'gevent':
+    # Каждый гринлет открывал бы собственное постоянное соединение.
+    raw_env = ['DB_CONN_MAX_AGE=0']
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from recipes.models import (Ingredient, IngredientRecipe, Favorite,
-                            Recipe, ShoppingCart, Tag)
+from recipes.models import (FeedEntry, Ingredient, IngredientRecipe,
+                            Favorite, Recipe, ShoppingCart, ShoppingListItem,
+                            Tag)
 
 
 class RecipeInline(admin.TabularInline):
@@ -32,7 +33,7 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeInline, RecipeTagsInLine, )
     list_display = ('id', 'name', 'author',
-                    'cooking_time')
+                    'cooking_time', 'favorites_count')
     list_filter = ('name', 'author', 'tags__name',)
     search_fields = ('name', 'author__username', 'author__email')
 
@@ -53,3 +54,15 @@ class FavoriteAdmin(admin.ModelAdmin):
 class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     list_filter = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'total_amount')
+    list_filter = ('user',)
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'recipe', 'author', 'pub_date')
+    list_filter = ('user',)
@@ -0,0 +1,48 @@
+from bisect import bisect_left
+from operator import itemgetter
+
+from recipes.models import Ingredient
+from recipes.versions import catalogue_version
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self.snapshot = None
+
+    def build(self, version):
+        rows = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit').iterator()
+        entries = sorted(
+            ((name.casefold(), {'id': pk, 'name': name,
+                                'measurement_unit': measurement_unit})
+             for pk, name, measurement_unit in rows),
+            key=itemgetter(0)
+        )
+        self.snapshot = (version, [key for key, _ in entries], entries)
+        return self.snapshot
+
+    def get_snapshot(self):
+        version = catalogue_version()
+        if self.snapshot is None or self.snapshot[0] != version:
+            return self.build(version)
+        return self.snapshot
+
+    def search(self, query, limit):
+        _, keys, entries = self.get_snapshot()
+        query = query.casefold()
+        start = position = bisect_left(keys, query)
+        results = []
+        while (position < len(keys) and len(results) < limit
+               and keys[position].startswith(query)):
+            results.append(entries[position][1])
+            position += 1
+        for index, (key, ingredient) in enumerate(entries):
+            if len(results) >= limit:
+                break
+            if not start <= index < position and query in key:
+                results.append(ingredient)
+        return results
+
+
+ingredient_index = IngredientIndex()
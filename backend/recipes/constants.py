@@ -4,3 +4,7 @@ MAX_LENGTH_COLOR = 7
 MAX_VALUE = 3000
 MAX_TIME = 1500
 MIN_VALUE = 1
+MAX_BATCH_SIZE = 100
+SEARCH_CONFIG = 'russian'
+PANTRY_SEARCH_LIMIT = 20
+MAX_NAMESPACE_LENGTH = 255
@@ -0,0 +1,53 @@
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from user.models import User
+
+
+def create_user(username, **fields):
+    fields.setdefault('email', f'{username}@example.com')
+    fields.setdefault('first_name', f'Имя {username}')
+    fields.setdefault('last_name', f'Фамилия {username}')
+    return User.objects.create_user(
+        username=username, password='pass', **fields)
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                           slug=f'tag{number}')
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, amounts=None, tags=(), **fields):
+    fields.setdefault('name', 'Блины')
+    fields.setdefault('text', 'Описание')
+    recipe = Recipe.objects.create(author=author, cooking_time=10, **fields)
+    if tags:
+        recipe.tags.set(tags)
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in (amounts or {}).items()
+    )
+    return recipe
+
+
+def create_recipes(author, count):
+    tags = create_tags(3)
+    ingredients = create_ingredients(10)
+    return [
+        create_recipe(
+            author,
+            {ingredients[(number + shift) % 10]: shift + 1
+             for shift in range(4)},
+            tags[:number % 3 + 1],
+            name=f'Рецепт {number}')
+        for number in range(count)
+    ]
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from recipes.models import IngredientRecipe, Recipe
+from recipes.pantry import pantry_index
+
+
+def sql_pantry(ingredient_ids, limit):
+    recipes = Recipe.objects.annotate(
+        matched=Count('ingredientrecipe', filter=Q(
+            ingredientrecipe__ingredient__in=ingredient_ids)),
+        total=Count('ingredientrecipe'),
+    ).filter(matched__gt=0).annotate(
+        coverage=Cast('matched', FloatField()) / F('total')
+    ).order_by('-coverage', '-matched', '-id').values_list(
+        'id', 'matched', 'total')
+    return list(recipes[:limit])
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает подбор рецептов по набору ингредиентов через '
+            'индекс в памяти и через SQL-запрос')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--pantry-size', type=int, default=8)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def measure(self, search, pantries, limit):
+        latencies, results = [], []
+        for pantry in pantries:
+            started = time.perf_counter()
+            results.append(search(pantry, limit))
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies, results
+
+    def report(self, label, latencies):
+        ordered = sorted(latencies)
+        self.stdout.write(
+            f'{label}: p50={statistics.median(ordered):.2f} мс, '
+            f'p95={ordered[int(len(ordered) * 0.95)]:.2f} мс, '
+            f'max={ordered[-1]:.2f} мс')
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(IngredientRecipe.objects.values_list(
+            'ingredient_id', flat=True).distinct())
+        if not ingredient_ids:
+            raise CommandError(
+                'Недостаточно данных: запустите generate_load_data')
+        generator = random.Random(options['seed'])
+        pantries = [
+            generator.sample(ingredient_ids, min(
+                options['pantry_size'], len(ingredient_ids)))
+            for _ in range(options['queries'])
+        ]
+        started = time.perf_counter()
+        pantry_index.search(pantries[0], options['limit'])
+        self.stdout.write(
+            f'Построение индекса: '
+            f'{(time.perf_counter() - started) * 1000:.0f} мс')
+
+        index_latencies, index_results = self.measure(
+            pantry_index.search, pantries, options['limit'])
+        sql_latencies, sql_results = self.measure(
+            sql_pantry, pantries, options['limit'])
+        self.report('Индекс в памяти', index_latencies)
+        self.report('SQL', sql_latencies)
+
+        mismatches = sum(
+            [tuple(match) for match in index_result] != [
+                tuple(match) for match in sql_result]
+            for index_result, sql_result in zip(index_results, sql_results)
+        )
+        if mismatches:
+            raise CommandError(
+                f'Результаты расходятся в {mismatches} запросах')
+        speedup = (statistics.median(sql_latencies)
+                   / statistics.median(index_latencies))
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты совпадают ({options["queries"]} запросов), '
+            f'ускорение: {speedup:.1f}x'))
@@ -0,0 +1,249 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from recipes.versions import bump_catalogue_version, bump_versions
+from user.models import Subscription, User
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+ZIPF_EXPONENT = 1.1
+PARETO_ALPHA = 2
+HISTORY_DAYS = 365
+DEFAULT_EPOCH = '2024-01-01T00:00:00+00:00'
+
+
+def aware_datetime(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+@contextmanager
+def manual_timestamps(*fields):
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные для нагрузочного '
+            'тестирования: пользователей, рецепты, избранное, '
+            'списки покупок и подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--max-ingredients', type=int, default=12)
+        parser.add_argument('--favorites-per-user', type=float, default=10)
+        parser.add_argument('--cart-per-user', type=float, default=3)
+        parser.add_argument('--subscriptions-per-user', type=float,
+                            default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--epoch', type=aware_datetime,
+                            default=aware_datetime(DEFAULT_EPOCH),
+                            help='Момент, от которого отсчитываются даты '
+                                 'публикации и добавления')
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имён создаваемых пользователей')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.now = options['epoch']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом "{prefix}" уже существуют')
+
+        self.ingredient_ids = self.load_ingredients()
+        self.tag_ids = self.load_tags()
+        user_ids = self.create_users()
+        recipe_ids = self.create_recipes(user_ids)
+        self.create_recipe_relations(recipe_ids)
+        self.create_user_relations(Favorite, user_ids, recipe_ids,
+                                   options['favorites_per_user'])
+        self.create_user_relations(ShoppingCart, user_ids, recipe_ids,
+                                   options['cart_per_user'])
+        self.create_subscriptions(user_ids)
+
+        call_command('recount', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout,
+                     batch_size=options['batch_size'])
+        call_command('rebuild_feed', stdout=self.stdout)
+        # bulk_create не отправляет сигналы, поэтому кэши рецептов,
+        # каталога и индекс «из того, что есть» сбрасываются явно.
+        bump_versions(['recipes', *(
+            f'recipes:tag:{slug}'
+            for slug in Tag.objects.values_list('slug', flat=True))])
+        bump_catalogue_version()
+
+    def report(self, label, count, started):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else count
+        self.stdout.write(
+            f'{label}: {count} за {elapsed:.1f} с ({rate:.0f} строк/с)')
+
+    def insert(self, model, objects):
+        objects = iter(objects)
+        count = 0
+        while True:
+            batch = list(islice(objects, self.options['batch_size']))
+            if not batch:
+                return count
+            model.objects.bulk_create(batch)
+            count += len(batch)
+
+    def zipf_weights(self, size):
+        return list(accumulate(
+            1 / rank ** ZIPF_EXPONENT for rank in range(1, size + 1)))
+
+    def activity(self, average, limit):
+        skew = self.random.paretovariate(PARETO_ALPHA) - 1
+        return min(limit, int(average * skew))
+
+    def sample(self, population, cum_weights, count, exclude=None):
+        picked = dict.fromkeys(self.random.choices(
+            population, cum_weights=cum_weights, k=count * 2))
+        picked.pop(exclude, None)
+        return list(picked)[:count]
+
+    def past_moment(self):
+        return self.now - timedelta(
+            seconds=self.random.randrange(HISTORY_DAYS * 24 * 60 * 60))
+
+    def load_ingredients(self):
+        if not Ingredient.objects.exists():
+            call_command('import_ingredients', stdout=self.stdout)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def load_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self):
+        started = time.monotonic()
+        prefix = self.options['prefix']
+        password = make_password(prefix)
+        self.insert(User, (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=f'{prefix}_first_{number}',
+                last_name=f'{prefix}_last_{number}',
+                password=password,
+            ) for number in range(self.options['users'])
+        ))
+        user_ids = list(User.objects.filter(
+            username__startswith=prefix).order_by('id').values_list(
+                'id', flat=True))
+        self.report('Пользователи', len(user_ids), started)
+        return user_ids
+
+    def create_recipes(self, user_ids):
+        started = time.monotonic()
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        author_weights = self.zipf_weights(len(authors))
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        recipes = (
+            Recipe(
+                author_id=author_id,
+                name=f'Рецепт {number}',
+                text=f'Описание рецепта {number}',
+                cooking_time=self.random.randint(5, 180),
+                pub_date=self.past_moment(),
+            ) for number, author_id in enumerate(self.random.choices(
+                authors, cum_weights=author_weights,
+                k=self.options['recipes']))
+        )
+        with manual_timestamps(Recipe._meta.get_field('pub_date')):
+            self.insert(Recipe, recipes)
+        recipe_ids = list(Recipe.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True))
+        self.report('Рецепты', len(recipe_ids), started)
+        return recipe_ids
+
+    def create_recipe_relations(self, recipe_ids):
+        started = time.monotonic()
+        ingredients = self.ingredient_ids[:]
+        self.random.shuffle(ingredients)
+        weights = self.zipf_weights(len(ingredients))
+        max_ingredients = min(self.options['max_ingredients'],
+                              len(ingredients))
+        count = self.insert(IngredientRecipe, (
+            IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.sample(
+                ingredients, weights,
+                self.random.randint(1, max_ingredients))
+        ))
+        self.report('Ингредиенты рецептов', count, started)
+
+        started = time.monotonic()
+        count = self.insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(
+                self.tag_ids, self.random.randint(1, len(self.tag_ids)))
+        ))
+        self.report('Теги рецептов', count, started)
+
+    def create_user_relations(self, model, user_ids, recipe_ids, average):
+        started = time.monotonic()
+        popular = recipe_ids[:]
+        self.random.shuffle(popular)
+        weights = self.zipf_weights(len(popular))
+        objects = (
+            model(user_id=user_id, recipe_id=recipe_id,
+                  added_at=self.past_moment())
+            for user_id in user_ids
+            for recipe_id in self.sample(
+                popular, weights, self.activity(average, len(popular)))
+        )
+        with manual_timestamps(model._meta.get_field('added_at')):
+            count = self.insert(model, objects)
+        self.report(model._meta.verbose_name_plural, count, started)
+
+    def create_subscriptions(self, user_ids):
+        started = time.monotonic()
+        authors = list(Recipe.objects.filter(
+            author_id__in=user_ids).order_by('author_id').values_list(
+                'author_id', flat=True).distinct())
+        self.random.shuffle(authors)
+        weights = self.zipf_weights(len(authors))
+        count = self.insert(Subscription, (
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(
+                authors, weights,
+                self.activity(self.options['subscriptions_per_user'],
+                              len(authors)),
+                exclude=user_id)
+        ))
+        self.report('Подписки', count, started)
@@ -1,26 +1,115 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from recipes.models import Ingredient
+from recipes.versions import bump_catalogue_version
+
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'recipes' / 'data' / 'ingredients.csv'
+READ_SIZE = 64 * 1024
+JSON_FIELDS = {'name', 'measurement_unit'}
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            if len(row) != 2:
+                raise CommandError(f'Некорректная строка CSV: {row}')
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            position = skip_separators(buffer, position)
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            if not isinstance(item, dict) or not JSON_FIELDS <= item.keys():
+                raise CommandError(f'Некорректный ингредиент в JSON: {item}')
+            yield item['name'], item['measurement_unit']
+            position = end
+        if not chunk:
+            if buffer[position:].strip(' \t\r\n]'):
+                raise CommandError('Некорректный JSON файл')
+            return
+
+
+def skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+        position += 1
+    return position
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'Импортирует ингредиенты из CSV файла в базу данных'
+    help = 'Импортирует ингредиенты из CSV или JSON файлов в базу данных'
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Путь к CSV файлу')
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            type=Path,
+            default=[DEFAULT_PATH],
+            help='Пути к CSV или JSON файлам'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество ингредиентов в одном INSERT'
+        )
+
+    def read_rows(self, paths):
+        for path in paths:
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                raise CommandError(f'Неподдерживаемый формат файла: {path}')
+            with open(path, 'r', encoding='utf-8') as file:
+                yield from reader(file)
 
     def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            csv_reader = csv.reader(file)
-            for row in csv_reader:
-                name, measurement_unit = row
-                Ingredient.objects.create(
-                    name=name,
-                    measurement_unit=measurement_unit,
-                )
-                self.stdout.write(self.style.SUCCESS(
-                    f'Ингредиент успешно загружен: {name}'))
+        batch_size = options['batch_size']
+        rows = self.read_rows(options['paths'])
+        started = time.monotonic()
+        processed = 0
+        with transaction.atomic():
+            initial = Ingredient.objects.count()
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(
+                    batch, ignore_conflicts=True)
+                processed += len(batch)
+            created = Ingredient.objects.count() - initial
+        bump_catalogue_version()
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else processed
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено ингредиентов: '
+            f'{created}, пропущено дубликатов: {processed - created}. '
+            f'Время: {elapsed:.2f} с ({rate:.0f} строк/с)'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает ленты подписок пользователей по подпискам '
+            'и рецептам авторов')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            FeedEntry.objects.materialize()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}'))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipe, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает и сверяет агрегированные списки покупок '
+            'с содержимым корзин пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить таблицу, не перестраивая её'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пакета для bulk_create'
+        )
+
+    def expected_totals(self):
+        rows = IngredientRecipe.objects.filter(
+            recipe__shoppingcarts__isnull=False).values_list(
+                'recipe__shoppingcarts__user', 'ingredient').annotate(
+                    total=Sum('amount')).order_by()
+        return {(user_id, ingredient_id): total
+                for user_id, ingredient_id, total in rows.iterator()}
+
+    def stored_totals(self):
+        rows = ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount')
+        return {(user_id, ingredient_id): total
+                for user_id, ingredient_id, total in rows.iterator()}
+
+    def count_drift(self, expected):
+        stored = self.stored_totals()
+        return sum(
+            1 for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        )
+
+    def handle(self, *args, **options):
+        expected = self.expected_totals()
+        drift = self.count_drift(expected)
+        self.stdout.write(
+            f'Позиций в списках покупок: {len(expected)}, '
+            f'расхождений: {drift}')
+        if options['check']:
+            if drift:
+                raise CommandError('Списки покупок рассинхронизированы')
+            return
+
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (ShoppingListItem(user_id=user_id,
+                                  ingredient_id=ingredient_id,
+                                  total_amount=total)
+                 for (user_id, ingredient_id), total in expected.items()),
+                batch_size=options['batch_size']
+            )
+        if self.count_drift(expected):
+            raise CommandError('Пересборка списков покупок не удалась')
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from user.models import Subscription, User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики рецептов, подписчиков и избранного '
+            'и исправляет расхождения')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            drifted = model.objects.annotate(
+                actual=count_of(related_model, field)
+            ).exclude(**{counter: F('actual')})
+            fixed = model.objects.filter(
+                pk__in=list(drifted.values_list('pk', flat=True))
+            ).update(**{counter: count_of(related_model, field)})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{counter}: '
+                f'исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,82 @@
+# Generated by Django 3.2.20 on 2026-10-18 05:58
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}text, '')), 'B')"
+)
+POSTGRESQL_FORWARD = (
+    'CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update() '
+    'RETURNS trigger AS $$ BEGIN '
+    f'NEW.search_vector := {SEARCH_VECTOR.format(row="NEW.")}; '
+    'RETURN NEW; END $$ LANGUAGE plpgsql',
+    'CREATE TRIGGER recipes_recipe_search_vector '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update()',
+    f'UPDATE recipes_recipe SET search_vector = {SEARCH_VECTOR.format(row="")}',
+    'CREATE INDEX recipes_recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe '
+    'BEGIN INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe '
+    'BEGIN INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, '
+    "text) VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER recipes_recipe_fts_update AFTER UPDATE OF name, text '
+    'ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def create_search_index(apps, schema_editor):
+    forward, _ = STATEMENTS.get(schema_editor.connection.vendor, ((), ()))
+    for statement in forward:
+        schema_editor.execute(statement, params=None)
+
+
+def drop_search_index(apps, schema_editor):
+    _, backward = STATEMENTS.get(schema_editor.connection.vendor, ((), ()))
+    for statement in backward:
+        schema_editor.execute(statement, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
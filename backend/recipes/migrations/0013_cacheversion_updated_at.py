@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_cacheversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cacheversion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+    ]
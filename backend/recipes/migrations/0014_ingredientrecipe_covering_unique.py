@@ -0,0 +1,25 @@
+# Generated by Django 3.2.20 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_cacheversion_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredientrecipe',
+            name='unique_recipe_ingredient',
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredientrecipe',
+            name='ingredientrecipe_amount_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), include=('amount',), name='unique_recipe_ingredient'),
+        ),
+    ]
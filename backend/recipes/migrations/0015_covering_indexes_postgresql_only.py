@@ -0,0 +1,59 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+# SQLite не поддерживает неключевые столбцы: уникальное ограничение с
+# INCLUDE на нём не создаётся вовсе, поэтому покрывающие индексы
+# строятся только на PostgreSQL.
+COVERED_INDEXES = (
+    ('favorite', 'favorite_user_added_idx'),
+    ('shoppingcart', 'shoppingcart_user_added_idx'),
+)
+
+
+def create_amount_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS ingredientrecipe_amount_idx '
+        'ON recipes_ingredientrecipe (recipe_id, ingredient_id) '
+        'INCLUDE (amount)'
+    )
+
+
+def drop_amount_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS ingredientrecipe_amount_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_ingredientrecipe_covering_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredientrecipe',
+            name='unique_recipe_ingredient',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.RunPython(create_amount_index, drop_amount_index),
+        # Индексы из 0008 на PostgreSQL уже содержат INCLUDE (recipe_id),
+        # меняется только состояние моделей.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            operation
+            for model_name, name in COVERED_INDEXES
+            for operation in (
+                migrations.RemoveIndex(model_name=model_name, name=name),
+                migrations.AddIndex(
+                    model_name=model_name,
+                    index=models.Index(fields=['user', '-added_at'], name=name),
+                ),
+            )
+        ]),
+    ]
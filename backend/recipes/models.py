@@ -1,11 +1,21 @@
+import heapq
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
 from django.core.validators import (MinValueValidator, MaxValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import connections, models
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Q,
+                              Subquery, Sum, Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 from recipes.constants import (MAX_FIELD_LENGTH, MAX_FIELD_LENGTH_RECIPE,
-                               MAX_LENGTH_COLOR, MAX_TIME, MAX_VALUE,
-                               MIN_VALUE)
-from user.models import User
+                               MAX_LENGTH_COLOR, MAX_NAMESPACE_LENGTH,
+                               MAX_TIME, MAX_VALUE, MIN_VALUE, SEARCH_CONFIG)
+from user.models import Subscription, User
 
 
 class Ingredient(models.Model):
@@ -67,6 +77,74 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            false = Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient')
+            ),
+        )
+
+    def latest_per_author(self, author_ids, limit):
+        if not author_ids:
+            return self.none()
+        ranked = Recipe.objects.filter(author__in=author_ids).annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        ).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+    def search(self, query):
+        if connections[self.db].vendor == 'postgresql':
+            search_query = SearchQuery(
+                query, config=SEARCH_CONFIG, search_type='websearch')
+            return self.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(F('search_vector'), search_query))
+        terms = ' '.join(
+            f'"{term}"*' for term in query.replace('"', ' ').split())
+        if not terms:
+            return self.none().annotate(search_rank=Value(
+                0.0, output_field=models.FloatField()))
+        table = Recipe._meta.db_table
+        return self.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s',
+            (terms,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({table}_fts, 4.0, 1.0) FROM {table}_fts '
+            f'WHERE {table}_fts MATCH %s AND rowid = {table}.id',
+            (terms,),
+            output_field=models.FloatField()
+        ))
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -110,11 +188,41 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во добавлений в избранное'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('updated_at',),
+                name='recipe_updated_at_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -178,6 +286,51 @@ class TagRecipe(models.Model):
         return f'Рецепт {self.recipe} содержит тег {self.tag}'
 
 
+class UserRecipeQuerySet(models.QuerySet):
+
+    def add(self, user_id, recipe_ids):
+        if not recipe_ids:
+            return []
+        connection = connections[self.db]
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, recipe_id, added_at) '
+                f'SELECT %s, id, %s FROM {Recipe._meta.db_table} '
+                f'WHERE id IN ({placeholders}) '
+                'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+                'RETURNING recipe_id',
+                [user_id, added_at, *recipe_ids]
+            )
+            added = [row[0] for row in cursor.fetchall()]
+        self._shift_counter(added, 1)
+        return added
+
+    def remove(self, user_id, recipe_ids):
+        if not recipe_ids:
+            return []
+        connection = connections[self.db]
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.model._meta.db_table} '
+                f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                'RETURNING recipe_id',
+                [user_id, *recipe_ids]
+            )
+            removed = [row[0] for row in cursor.fetchall()]
+        self._shift_counter(removed, -1)
+        return removed
+
+    def _shift_counter(self, recipe_ids, delta):
+        field = self.model.counter_field
+        if field and recipe_ids:
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                **{field: F(field) + delta})
+
+
 class CommonFields(models.Model):
     user = models.ForeignKey(
         User,
@@ -195,6 +348,9 @@ class CommonFields(models.Model):
         auto_now_add=True,
         verbose_name='Дата и время добавления'
     )
+    counter_field = None
+
+    objects = UserRecipeQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -212,6 +368,7 @@ class CommonFields(models.Model):
 
 
 class Favorite(CommonFields):
+    counter_field = 'favorites_count'
 
     class Meta:
         verbose_name = 'Избранное'
@@ -221,6 +378,11 @@ class Favorite(CommonFields):
                 fields=['user', 'recipe'],
                 name='unique_favourite')
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-added_at'],
+                name='favorite_user_added_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Избранное'
@@ -236,6 +398,258 @@ class ShoppingCart(CommonFields):
                 fields=['user', 'recipe'],
                 name='unique_shopping_cart')
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-added_at'],
+                name='shoppingcart_user_added_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Список покупок'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+
+    def add_recipes(self, user_ids, recipe_ids):
+        amounts = IngredientRecipe.objects.filter(recipe__in=recipe_ids)
+        ingredient_ids = set(amounts.values_list('ingredient_id', flat=True))
+        if not user_ids or not ingredient_ids:
+            return
+        self.bulk_create(
+            [self.model(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids for ingredient_id in ingredient_ids],
+            ignore_conflicts=True
+        )
+        self._shift_totals(user_ids, amounts)
+
+    def remove_recipes(self, user_ids, recipe_ids):
+        if not user_ids:
+            return
+        amounts = IngredientRecipe.objects.filter(recipe__in=recipe_ids)
+        self._shift_totals(user_ids, amounts, subtract=True)
+        self.filter(user__in=user_ids, total_amount__lte=0).delete()
+
+    def shift_ingredient(self, user_ids, ingredient_id, amount):
+        if not user_ids or not amount:
+            return
+        if amount > 0:
+            self.bulk_create(
+                [self.model(user_id=user_id, ingredient_id=ingredient_id)
+                 for user_id in user_ids],
+                ignore_conflicts=True
+            )
+        items = self.filter(user__in=user_ids, ingredient=ingredient_id)
+        items.update(total_amount=F('total_amount') + amount)
+        if amount < 0:
+            items.filter(total_amount__lte=0).delete()
+
+    def _shift_totals(self, user_ids, amounts, subtract=False):
+        total = Subquery(
+            amounts.filter(ingredient=OuterRef('ingredient')).values(
+                'ingredient').annotate(total=Sum('amount')).values('total')
+        )
+        total_amount = (F('total_amount') - total if subtract
+                        else F('total_amount') + total)
+        self.filter(
+            user__in=user_ids,
+            ingredient__in=amounts.values('ingredient')
+        ).update(total_amount=total_amount)
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.user}: {self.ingredient} - {self.total_amount}')
+
+
+class FeedEntryQuerySet(models.QuerySet):
+
+    def materialize(self, user_ids=None, author_ids=None, recipe_ids=None,
+                    popular=False):
+        conditions, params = [], []
+        for column, ids in (('s.user_id', user_ids),
+                            ('s.author_id', author_ids),
+                            ('r.id', recipe_ids)):
+            if ids is not None:
+                if not ids:
+                    return
+                conditions.append(
+                    f'{column} IN ({", ".join(["%s"] * len(ids))})')
+                params.extend(ids)
+        if not popular:
+            conditions.append('u.subscribers_count < %s')
+            params.append(settings.FEED_FANOUT_LIMIT)
+        where = ' AND '.join(conditions) or 'TRUE'
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, recipe_id, author_id, pub_date) '
+                'SELECT s.user_id, r.id, r.author_id, r.pub_date '
+                f'FROM {Subscription._meta.db_table} s '
+                f'JOIN {Recipe._meta.db_table} r ON r.author_id = s.author_id '
+                f'JOIN {User._meta.db_table} u ON u.id = s.author_id '
+                f'WHERE {where} '
+                'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                params
+            )
+
+    def prune(self, user_id, author_ids):
+        self.filter(user_id=user_id, author_id__in=author_ids).delete()
+        demoted = list(Subscription.objects.filter(
+            author__in=author_ids).values('author').annotate(
+                subscribers=Count('id')).filter(
+                    subscribers=settings.FEED_FANOUT_LIMIT - 1).values_list(
+                        'author', flat=True))
+        if demoted:
+            self.materialize(author_ids=demoted, popular=True)
+
+    def page(self, user, before, limit):
+        entries = self.filter(user=user)
+        popular = Recipe.objects.filter(author__in=Subscription.objects.filter(
+            user=user,
+            author__subscribers_count__gte=settings.FEED_FANOUT_LIMIT
+        ).values('author'))
+        if before is not None:
+            pub_date, recipe_id = before
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, recipe_id__lt=recipe_id))
+            popular = popular.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, id__lt=recipe_id))
+        streams = (
+            entries.order_by('-pub_date', '-recipe_id').values_list(
+                'pub_date', 'recipe_id')[:limit],
+            popular.order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id')[:limit],
+        )
+        page = []
+        for row in heapq.merge(*streams, reverse=True):
+            if not page or page[-1] != row:
+                page.append(row)
+            if len(page) == limit:
+                break
+        return page
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class CacheVersionQuerySet(models.QuerySet):
+
+    def current(self, namespaces):
+        if not namespaces:
+            return {}
+        return dict(self.filter(namespace__in=namespaces).values_list(
+            'namespace', 'version'))
+
+    def bump(self, namespaces):
+        namespaces = sorted(set(namespaces))
+        if not namespaces:
+            return
+        connection = connections[self.db]
+        table = self.model._meta.db_table
+        updated_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        placeholders = ', '.join(['(%s, 1, %s)'] * len(namespaces))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (namespace, version, updated_at) '
+                f'VALUES {placeholders} '
+                'ON CONFLICT (namespace) DO UPDATE '
+                f'SET version = {table}.version + 1, '
+                'updated_at = EXCLUDED.updated_at',
+                [value for namespace in namespaces
+                 for value in (namespace, updated_at)]
+            )
+
+
+class CacheVersion(models.Model):
+    namespace = models.CharField(
+        primary_key=True,
+        max_length=MAX_NAMESPACE_LENGTH,
+        verbose_name='Пространство имён'
+    )
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения')
+
+    objects = CacheVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Версия кэша'
+        verbose_name_plural = 'Версии кэша'
+
+    def __str__(self):
+        return f'{self.namespace}: {self.version}'
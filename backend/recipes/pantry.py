@@ -0,0 +1,106 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from recipes.models import IngredientRecipe, Recipe
+from recipes.versions import get_versions
+
+REFRESH_OVERLAP = timedelta(minutes=1)
+REBUILD_INTERVAL = 60 * 60
+
+
+class PantryIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built_at = 0
+        self.watermark = None
+        self.postings = {}
+        self.recipe_ingredients = {}
+
+    def build(self, version):
+        watermark = timezone.now() - REFRESH_OVERLAP
+        recipe_ingredients = {
+            pk: [] for pk in Recipe.objects.values_list(
+                'id', flat=True).iterator()
+        }
+        postings = defaultdict(lambda: array('l'))
+        rows = IngredientRecipe.objects.order_by('recipe_id').values_list(
+            'recipe_id', 'ingredient_id').iterator()
+        for recipe_id, ingredient_id in rows:
+            if recipe_id in recipe_ingredients:
+                recipe_ingredients[recipe_id].append(ingredient_id)
+                postings[ingredient_id].append(recipe_id)
+        self.postings = dict(postings)
+        self.recipe_ingredients = {
+            pk: tuple(ingredients)
+            for pk, ingredients in recipe_ingredients.items()
+        }
+        self.version = version
+        self.watermark = watermark
+        self.built_at = time.monotonic()
+
+    def discard(self, recipe_id):
+        for ingredient_id in self.recipe_ingredients.pop(recipe_id, ()):
+            posting = self.postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+
+    def refresh(self, version):
+        watermark = timezone.now() - REFRESH_OVERLAP
+        recipe_ids = set(Recipe.objects.values_list(
+            'id', flat=True).iterator())
+        for recipe_id in self.recipe_ingredients.keys() - recipe_ids:
+            self.discard(recipe_id)
+        changed = recipe_ids - self.recipe_ingredients.keys()
+        changed.update(Recipe.objects.filter(
+            updated_at__gte=self.watermark).order_by().values_list(
+                'id', flat=True))
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+                recipe_id__in=changed).values_list(
+                    'recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id in changed:
+            self.discard(recipe_id)
+            self.recipe_ingredients[recipe_id] = tuple(
+                ingredients[recipe_id])
+            for ingredient_id in ingredients[recipe_id]:
+                insort(self.postings.setdefault(
+                    ingredient_id, array('l')), recipe_id)
+        self.version = version
+        self.watermark = watermark
+
+    def sync(self):
+        version = get_versions(['recipes'])[0]
+        if self.version is None or (
+                time.monotonic() - self.built_at > REBUILD_INTERVAL):
+            self.build(version)
+        elif self.version != version:
+            self.refresh(version)
+
+    def search(self, ingredient_ids, limit):
+        with self.lock:
+            self.sync()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self.postings.get(ingredient_id, ()))
+            sizes = {
+                recipe_id: len(self.recipe_ingredients[recipe_id])
+                for recipe_id in matched
+            }
+        return heapq.nlargest(
+            limit,
+            ((recipe_id, count, sizes[recipe_id])
+             for recipe_id, count in matched.items()),
+            key=lambda match: (match[1] / match[2], match[1], match[0])
+        )
+
+
+pantry_index = PantryIndex()
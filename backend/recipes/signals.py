@@ -0,0 +1,186 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (FeedEntry, Favorite, Ingredient,
+                            IngredientRecipe, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.versions import bump_catalogue_version, bump_versions
+from user.models import Subscription, User
+
+PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def recipe_namespaces(recipe_id, author_id, tag_slugs):
+    return [
+        'recipes',
+        f'recipe:{recipe_id}',
+        f'recipes:author:{author_id}',
+        *(f'recipes:tag:{slug}' for slug in tag_slugs),
+    ]
+
+
+def invalidate_recipe(recipe, tag_slugs=None):
+    if tag_slugs is None:
+        tag_slugs = list(recipe.tags.values_list('slug', flat=True))
+    namespaces = recipe_namespaces(recipe.id, recipe.author_id, tag_slugs)
+    transaction.on_commit(lambda: bump_versions(namespaces))
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.materialize(recipe_ids=[instance.id])
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.materialize(
+            user_ids=[instance.user_id], author_ids=[instance.author_id])
+
+
+@receiver(post_delete, sender=Subscription)
+def prune_feed(sender, instance, **kwargs):
+    FeedEntry.objects.prune(instance.user_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        favorites_count=F('favorites_count') - 1)
+
+
+def cart_user_ids(recipe_id):
+    return list(ShoppingCart.objects.filter(
+        recipe=recipe_id).values_list('user_id', flat=True))
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=IngredientRecipe)
+def remember_shopping_list_row(sender, instance, **kwargs):
+    instance.previous_row = sender.objects.filter(
+        pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_to_shopping_list(sender, instance, **kwargs):
+    previous = instance.previous_row
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+                instance.user_id, instance.recipe_id):
+            return
+        ShoppingListItem.objects.remove_recipes(
+            [previous.user_id], [previous.recipe_id])
+    ShoppingListItem.objects.add_recipes(
+        [instance.user_id], [instance.recipe_id])
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_from_shopping_list(sender, instance, **kwargs):
+    ShoppingListItem.objects.remove_recipes(
+        [instance.user_id], [instance.recipe_id])
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def shift_shopping_list_amount(sender, instance, **kwargs):
+    previous = instance.previous_row
+    if previous is not None:
+        ShoppingListItem.objects.shift_ingredient(
+            cart_user_ids(previous.recipe_id),
+            previous.ingredient_id, -previous.amount)
+    ShoppingListItem.objects.shift_ingredient(
+        cart_user_ids(instance.recipe_id),
+        instance.ingredient_id, instance.amount)
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def subtract_shopping_list_amount(sender, instance, **kwargs):
+    ShoppingListItem.objects.shift_ingredient(
+        cart_user_ids(instance.recipe_id),
+        instance.ingredient_id, -instance.amount)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_catalogue(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, **kwargs):
+    invalidate_recipe(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    invalidate_recipe(instance)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    recipe = Recipe.objects.filter(pk=instance.recipe_id).first()
+    if recipe is not None:
+        invalidate_recipe(recipe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if reverse:
+        recipes = (Recipe.objects.filter(pk__in=pk_set) if pk_set
+                   else instance.recipes.all())
+        for recipe in recipes:
+            invalidate_recipe(recipe)
+        return
+    tag_slugs = set(instance.tags.values_list('slug', flat=True))
+    if pk_set:
+        tag_slugs.update(
+            Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+    invalidate_recipe(instance, tag_slugs)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_profile(sender, instance, update_fields, **kwargs):
+    instance.profile_changed = False
+    fields = PROFILE_FIELDS if update_fields is None else (
+        PROFILE_FIELDS & set(update_fields))
+    if instance._state.adding or not fields:
+        return
+    previous = User.objects.filter(
+        pk=instance.pk, recipes_count__gt=0).values(*fields).first()
+    instance.profile_changed = previous is not None and any(
+        previous[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_profile(sender, instance, **kwargs):
+    if instance.profile_changed:
+        transaction.on_commit(lambda: bump_versions(['recipes:authors']))
@@ -0,0 +1,292 @@
+import json
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.plans import full_scans, hot_queries
+from recipes.factories import create_recipe, create_recipes, create_user
+from recipes.management.commands import import_ingredients
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from recipes.versions import bump_versions, get_versions
+from user.models import Subscription, User
+
+
+class ShoppingListUpkeepTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.buyer = create_user('buyer')
+        cls.flour, cls.milk, cls.eggs = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Молоко', 'Яйца')
+        )
+
+    def setUp(self):
+        self.recipe = create_recipe(
+            self.author, {self.flour: 100, self.milk: 200})
+        self.other = create_recipe(self.author, {self.flour: 50})
+        for recipe in (self.recipe, self.other):
+            ShoppingCart.objects.create(user=self.buyer, recipe=recipe)
+
+    def assert_totals(self, expected):
+        totals = dict(ShoppingListItem.objects.filter(
+            user=self.buyer).values_list('ingredient', 'total_amount'))
+        self.assertEqual(totals, {
+            ingredient.id: amount for ingredient, amount in expected.items()
+        })
+        call_command('rebuild_shopping_lists', check=True, stdout=StringIO())
+
+    def test_cart_rows(self):
+        self.assert_totals({self.flour: 150, self.milk: 200})
+        ShoppingCart.objects.get(user=self.buyer, recipe=self.other).delete()
+        self.assert_totals({self.flour: 100, self.milk: 200})
+
+    def test_ingredient_rows(self):
+        row = IngredientRecipe.objects.get(
+            recipe=self.recipe, ingredient=self.milk)
+        row.amount = 300
+        row.save()
+        self.assert_totals({self.flour: 150, self.milk: 300})
+        row.ingredient = self.eggs
+        row.save()
+        self.assert_totals({self.flour: 150, self.eggs: 300})
+        row.delete()
+        self.assert_totals({self.flour: 150})
+
+    def test_recipe_delete(self):
+        self.recipe.delete()
+        self.assert_totals({self.flour: 50})
+
+    def test_author_delete(self):
+        self.author.delete()
+        self.assert_totals({})
+
+
+@override_settings(CACHE_VERSIONS_STORE='database')
+class CacheVersionTests(TestCase):
+
+    def test_versions_do_not_depend_on_local_cache(self):
+        before = get_versions(['recipes', 'recipe:1'])
+        bump_versions(['recipe:1'])
+        bumped = get_versions(['recipes', 'recipe:1'])
+        cache.clear()
+        self.assertEqual(get_versions(['recipes', 'recipe:1']), bumped)
+        self.assertEqual(bumped[0], before[0])
+        self.assertNotEqual(bumped[1], before[1])
+
+
+class AuthorProfileInvalidationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        create_recipe(cls.author)
+        cls.author.refresh_from_db()
+
+    def assert_bumped(self, change, bumped):
+        before = get_versions(['recipes:authors'])[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        after = get_versions(['recipes:authors'])[0]
+        self.assertEqual(after != before, bumped)
+
+    def test_signup_and_password_change(self):
+        def signup():
+            create_user('new')
+
+        def change_password():
+            self.author.set_password('secret')
+            self.author.save()
+
+        self.assert_bumped(signup, False)
+        self.assert_bumped(change_password, False)
+
+    def test_rendered_field_change(self):
+        def rename():
+            self.author.first_name = 'Шеф'
+            self.author.save()
+
+        self.assert_bumped(rename, True)
+
+    def test_user_without_recipes(self):
+        reader = create_user('reader')
+
+        def rename():
+            reader.first_name = 'Гость'
+            reader.save(update_fields=['first_name'])
+
+        self.assert_bumped(rename, False)
+
+
+class HotQueryIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = create_recipes(cls.author, 3)
+        for recipe in cls.recipes:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_hot_queries_avoid_full_scans(self):
+        queries = {
+            **hot_queries(self.reader, self.recipes[0]),
+            'recipes_changed': Recipe.objects.filter(
+                updated_at__gte=timezone.now()).order_by().values_list(
+                    'id', flat=True),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                plan = self.explain(queryset)
+                self.assertEqual(
+                    full_scans(plan, connection.vendor), set(), plan)
+
+    def test_full_scan_is_reported(self):
+        plan = self.explain(
+            Recipe.objects.filter(text='Описание').order_by())
+        self.assertEqual(
+            full_scans(plan, connection.vendor), {Recipe._meta.db_table})
+
+    def test_command_checks_plans(self):
+        stdout = StringIO()
+        call_command('explain_hot_queries', stdout=stdout)
+        self.assertIn('recipes_with_flags: OK', stdout.getvalue())
+        with patch('api.management.commands.explain_hot_queries.full_scans',
+                   return_value={Recipe._meta.db_table}):
+            with self.assertRaisesMessage(
+                    CommandError, Recipe._meta.db_table):
+                call_command('explain_hot_queries', stdout=StringIO())
+
+
+class RecountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipe = create_recipe(cls.author)
+        create_recipe(cls.author)
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipe)
+        Subscription.objects.create(user=cls.reader, author=cls.author)
+
+    def assert_counters(self):
+        self.author.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count,
+             self.recipe.favorites_count),
+            (2, 1, 1))
+
+    def test_signals_keep_counters(self):
+        self.assert_counters()
+
+    def test_recount_fixes_drift(self):
+        User.objects.filter(pk=self.author.pk).update(
+            recipes_count=7, subscribers_count=0)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=5)
+        stdout = StringIO()
+        call_command('recount', stdout=stdout)
+        self.assert_counters()
+        self.assertIn('recipes_count: исправлено 1', stdout.getvalue())
+        stdout = StringIO()
+        call_command('recount', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count('исправлено 0'), 3)
+
+
+class ImportIngredientsTests(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return path
+
+    def import_ingredients(self, *paths):
+        stdout = StringIO()
+        call_command('import_ingredients', *paths, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_rerun_is_idempotent(self):
+        rows = sum(1 for _ in open(
+            import_ingredients.DEFAULT_PATH, encoding='utf-8'))
+        output = self.import_ingredients()
+        self.assertIn(f'добавлено ингредиентов: {rows}', output)
+        self.assertEqual(Ingredient.objects.count(), rows)
+        output = self.import_ingredients()
+        self.assertIn('добавлено ингредиентов: 0', output)
+        self.assertEqual(Ingredient.objects.count(), rows)
+
+    def test_json_split_across_reads(self):
+        items = [{'name': f'Соль {number}', 'measurement_unit': 'г'}
+                 for number in range(50)]
+        path = self.write('ingredients.json', json.dumps(
+            items, ensure_ascii=False, indent=1))
+        with patch.object(import_ingredients, 'READ_SIZE', 7):
+            self.import_ingredients(path)
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('name', flat=True)),
+            sorted(item['name'] for item in items))
+
+    def test_broken_json_imports_nothing(self):
+        documents = {
+            'truncated': '[{"name": "Соль", "measurement_unit": "г"}, '
+                         '{"name": "Перец", "measur',
+            'malformed': '[{"name": "Соль" "measurement_unit": "г"}]',
+            'missing_field': '[{"name": "Соль"}]',
+            'not_an_object': '["Соль"]',
+        }
+        for name, content in documents.items():
+            with self.subTest(name):
+                path = self.write(f'{name}.json', content)
+                with self.assertRaises(CommandError):
+                    self.import_ingredients(path)
+                self.assertFalse(Ingredient.objects.exists())
+
+
+@override_settings(CACHE_VERSIONS_STORE='database')
+class GenerateLoadDataTests(TestCase):
+
+    def generate(self):
+        call_command('generate_load_data', users=15, recipes=40, seed=7,
+                     stdout=StringIO())
+        return (
+            list(Recipe.objects.order_by('id').values_list(
+                'name', 'author__username', 'pub_date', 'cooking_time')),
+            sorted(IngredientRecipe.objects.values_list(
+                'recipe__name', 'ingredient__name', 'amount')),
+            sorted(Favorite.objects.values_list(
+                'user__username', 'recipe__name', 'added_at')),
+            sorted(Subscription.objects.values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_seed_reproduces_data(self):
+        first = self.generate()
+        User.objects.filter(username__startswith='load').delete()
+        self.assertEqual(self.generate(), first)
+
+    def test_bumps_recipe_versions(self):
+        before = get_versions(['recipes'])
+        self.generate()
+        self.assertNotEqual(get_versions(['recipes']), before)
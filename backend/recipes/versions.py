@@ -0,0 +1,72 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import CacheVersion
+
+CATALOGUE = 'catalogue'
+
+
+def get_cache():
+    return caches[settings.API_CACHE]
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def get_cached_versions(namespaces):
+    cache = get_cache()
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return dict(zip(namespaces, (versions[key] for key in keys)))
+
+
+def get_versions(namespaces):
+    if settings.CACHE_VERSIONS_STORE == 'database':
+        versions = CacheVersion.objects.current(namespaces)
+    else:
+        versions = get_cached_versions(namespaces)
+    return [versions.get(namespace, 0) for namespace in namespaces]
+
+
+def get_versions_modified(namespaces):
+    if settings.CACHE_VERSIONS_STORE != 'database':
+        return get_versions(namespaces), None
+    rows = {
+        namespace: (version, updated_at)
+        for namespace, version, updated_at in CacheVersion.objects.filter(
+            namespace__in=namespaces).values_list(
+                'namespace', 'version', 'updated_at')
+    }
+    versions = [rows.get(namespace, (0,))[0] for namespace in namespaces]
+    modified = max(
+        (updated_at for _, updated_at in rows.values()),
+        default=datetime.fromtimestamp(0, timezone.utc))
+    return versions, modified
+
+
+def bump_versions(namespaces):
+    if settings.CACHE_VERSIONS_STORE == 'database':
+        CacheVersion.objects.bump(namespaces)
+        return
+    cache = get_cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(version_key(namespace))
+        except ValueError:
+            cache.add(version_key(namespace), time.time_ns(), timeout=None)
+
+
+def catalogue_version():
+    return get_versions([CATALOGUE])[0]
+
+
+def bump_catalogue_version():
+    bump_versions([CATALOGUE])
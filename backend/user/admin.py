@@ -6,18 +6,10 @@ from user.models import Subscription, User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name',
-                    'last_name', 'recipes_count')
+                    'last_name', 'recipes_count', 'subscribers_count')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('first_name', 'last_name', 'email')
 
-    @admin.display(description='Кол-во рецептов')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Кол-во подписчиков')
-    def subscribers_count(self, obj):
-        return obj.subscribed_by.count()
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import F
 
 from user.constants import MAX_FIELD_LENGTH, MAX_LENGTH_EMAIL
 
@@ -44,6 +45,16 @@ class User(AbstractUser):
         ],
         verbose_name='Пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Кол-во подписчиков'
+    )
 
     class Meta:
         ordering = ('username',)
@@ -54,6 +65,50 @@ class User(AbstractUser):
         return self.username
 
 
+class SubscriptionQuerySet(models.QuerySet):
+
+    def add(self, user_id, author_ids):
+        author_ids = [pk for pk in author_ids if pk != user_id]
+        if not author_ids:
+            return []
+        connection = connections[self.db]
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, author_id) '
+                f'SELECT %s, id FROM {User._meta.db_table} '
+                f'WHERE id IN ({placeholders}) '
+                'ON CONFLICT (user_id, author_id) DO NOTHING '
+                'RETURNING author_id',
+                [user_id, *author_ids]
+            )
+            added = [row[0] for row in cursor.fetchall()]
+        self._shift_counter(added, 1)
+        return added
+
+    def remove(self, user_id, author_ids):
+        if not author_ids:
+            return []
+        connection = connections[self.db]
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.model._meta.db_table} '
+                f'WHERE user_id = %s AND author_id IN ({placeholders}) '
+                'RETURNING author_id',
+                [user_id, *author_ids]
+            )
+            removed = [row[0] for row in cursor.fetchall()]
+        self._shift_counter(removed, -1)
+        return removed
+
+    def _shift_counter(self, author_ids, delta):
+        if author_ids:
+            User.objects.filter(pk__in=author_ids).update(
+                subscribers_count=F('subscribers_count') + delta)
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User,
@@ -68,6 +123,8 @@ class Subscription(models.Model):
         on_delete=models.CASCADE
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         ordering = ('author',)
         verbose_name = 'Подписка'